@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark - Verzendlabels Generator
+Meet de hot paths van de app op synthetische data:
+
+- de PDF modi van create_pdf_from_labels op synthetische labels (--labels)
+- de label engines van generate_shipping_labels, inclusief controle op gelijke uitvoer (--orders)
+- de volledige pipeline per stap op synthetische CSV exports, met tijd en piekgeheugen
+  per stap, weggeschreven als JSON zodat versies vergeleken kunnen worden (--suite)
+
+Gebruik:
+    python benchmark_labels.py --labels 1000 10000 30000
+    python benchmark_labels.py --labels 30000 --modes single_pass parallel --workers 8
+    python benchmark_labels.py --labels --orders 10000 100000
+    python benchmark_labels.py --labels --suite 10k 100k 1M 5M --json resultaten.json
+    python benchmark_labels.py --labels --suite 100k --skip create_pdf --compare vorige.json
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+from streamlit_labels_app import (
+    DATE_FORMATS,
+    OrderFrame,
+    create_pdf_from_labels,
+    filter_orders,
+    generate_excel_export,
+    generate_shipping_labels,
+    parse_paid_at,
+    read_csv_data,
+)
+
+PDF_MODES = ['merge', 'single_pass', 'parallel']
+
+# Stappen van de pipeline in de volgorde waarin de app ze uitvoert
+SUITE_STAGES = ['read_csv', 'normalize', 'filter', 'generate_labels', 'create_pdf', 'excel_export']
+
+STREETS = ['Kerkstraat', 'Dorpsweg', 'Stationsplein', 'Molenlaan', 'Burgemeester van Roijensingel']
+CITIES = ['Utrecht', 'Amsterdam', 'Zwolle', "'s-Hertogenbosch", 'Groningen']
+NAMES = ['Jan Jansen', 'Anna de Vries', 'Klaas Bakker', 'Marie Visser', 'Piet van den Berg']
+COMPANIES = ['', '', '', 'Boekhandel De Zeef BV', 'Stichting Lezen']
+PRODUCTS = ['Boek deel 1', 'Boek deel 2', 'Boek deel 3', 'Cadeaubon', 'Pakket']
+
+FIRSTNAMES = ['Jan', 'Anna', 'Klaas', 'Marie', 'Piet', 'Sanne', 'Daan', 'Fleur', None, '  ']
+LASTNAMES = ['Jansen', 'de Vries', 'Bakker', 'Visser', 'van den Berg', 'Smit', 'Mulder', None]
+SUFFIXES = [None, None, None, None, 'a', 'B', ' ', '-2', 'bis']
+QUANTITIES = ['1', '1', '1', '2', '3', '0', '-1', 'twee', None, '10']
+PAYMENT_METHODS = ['ideal', 'paypal', 'creditcard', 'bancontact']
+
+# Datumformaten van de synthetische paid_at kolom (plus lege en ongeldige waarden)
+SYNTHETIC_DATE_FORMATS = ['%Y-%m-%d %H:%M:%S', '%Y-%m-%d', '%d-%m-%Y %H:%M:%S', '%d-%m-%Y']
+
+
+def synthetic_labels(count, seed=42):
+    """Maak een lijst met realistische labelteksten (naam, adres, postcode + plaats)."""
+    rng = random.Random(seed)
+    labels = []
+    for _ in range(count):
+        name = rng.choice(NAMES)
+        company = rng.choice(COMPANIES)
+        if company:
+            name = f"{company}\n{name}"
+        address = f"{rng.choice(STREETS)} {rng.randint(1, 250)}{rng.choice(['', '', 'a', 'B'])}"
+        postal = f"{rng.randint(1000, 9999)} {rng.choice('ABCDEFGH')}{rng.choice('JKLMNPRS')} {rng.choice(CITIES)}"
+        labels.append(f"{name}\n{address}\n{postal}")
+    return labels
+
+
+def pick(rng, options, size):
+    """Kies size waarden uit options (ook None) als object array."""
+    values = np.empty(len(options), dtype=object)
+    values[:] = options
+    return values[rng.integers(0, len(options), size)]
+
+
+def synthetic_orders(count, seed=42):
+    """Maak een DataFrame met orders in het CSV formaat van de webshop export.
+
+    Orders worden verdeeld over ongeveer count / 3 klanten, zodat adressen vaak
+    terugkomen. Bedrijven, huisnummertoevoegingen, lege waarden, ongeldige aantallen
+    en gemengde datumformaten komen allemaal voor.
+    """
+    rng = np.random.default_rng(seed)
+    customer_count = max(1, count // 3)
+
+    # Klanten met een vast adres
+    firstname = pick(rng, FIRSTNAMES, customer_count)
+    lastname = pick(rng, LASTNAMES, customer_count)
+    company = pick(rng, COMPANIES + ['holding'], customer_count)
+    holding = company == 'holding'
+    company[holding] = [f"{first} {last} Holding" for first, last in zip(firstname[holding], lastname[holding])]
+    company[company == ''] = None
+
+    housenumber = rng.integers(1, 300, customer_count).astype(float)
+    housenumber[rng.random(customer_count) < 0.02] = np.nan
+    zip_digits = rng.integers(1000, 10000, customer_count).astype(str)
+    zip_letters = pick(rng, ['AB', 'CD', 'EF', 'GH', 'JK'], customer_count)
+    zipcode = np.where(rng.random(customer_count) < 0.8, zip_digits + ' ' + zip_letters, zip_digits + zip_letters).astype(object)
+    zipcode[rng.random(customer_count) < 0.02] = None
+
+    customers = pd.DataFrame({
+        'company': company,
+        'firstname': firstname,
+        'lastname': lastname,
+        'street': pick(rng, STREETS + [None], customer_count),
+        'housenumber': housenumber,
+        'housenumber_suffix': pick(rng, SUFFIXES, customer_count),
+        'zipcode': zipcode,
+        'city': pick(rng, CITIES + [None], customer_count),
+        'country_code': pick(rng, ['NL', 'NL', 'NL', 'BE'], customer_count),
+        'email': [f"klant{i}@example.nl" for i in range(customer_count)],
+    })
+
+    # Orders: een willekeurige klant per order
+    orders = customers.iloc[rng.integers(0, customer_count, count)].reset_index(drop=True)
+
+    # Betaaldatums in gemengde formaten
+    start = np.datetime64('2023-01-01T00:00:00')
+    seconds = rng.integers(0, 3 * 365 * 24 * 3600, count)
+    paid_at = pd.Series(start + seconds.astype('timedelta64[s]'))
+    format_choice = rng.integers(0, len(SYNTHETIC_DATE_FORMATS) + 2, count)
+    paid_at_text = pd.Series(None, index=paid_at.index, dtype=object)
+    for position, fmt in enumerate(SYNTHETIC_DATE_FORMATS):
+        selected = format_choice == position
+        paid_at_text[selected] = paid_at[selected].dt.strftime(fmt)
+    paid_at_text[format_choice == len(SYNTHETIC_DATE_FORMATS) + 1] = 'onbekend'
+
+    orders['product'] = pick(rng, PRODUCTS + [' Pakket'], count)
+    orders['quantity'] = pick(rng, QUANTITIES, count)
+    orders['paid_at'] = paid_at_text
+    orders['amount_with_tax'] = np.round(rng.uniform(5, 80, count), 2)
+    orders['payment_method'] = pick(rng, PAYMENT_METHODS, count)
+
+    columns = ['company', 'firstname', 'lastname', 'street', 'housenumber', 'housenumber_suffix',
+               'zipcode', 'city', 'country_code', 'product', 'quantity', 'paid_at',
+               'amount_with_tax', 'email', 'payment_method']
+    return orders[columns]
+
+
+def write_synthetic_csv(path, count, seed=42, chunk_size=500000):
+    """Schrijf een synthetische CSV export in blokken (ook geschikt voor miljoenen rijen)."""
+    for block, start in enumerate(range(0, count, chunk_size)):
+        size = min(chunk_size, count - start)
+        orders = synthetic_orders(size, seed=seed + block)
+        orders.to_csv(path, index=False, mode='w' if block == 0 else 'a', header=block == 0)
+    return path
+
+
+def label_engine_scenarios():
+    """Filtercombinaties waarop de label engines vergeleken worden."""
+    date_ranges = [(None, None), (datetime(2024, 3, 1), datetime(2024, 9, 30, 23, 59, 59, 999999))]
+    for sort_order in ['newest_first', 'oldest_first']:
+        for start_date, end_date in date_ranges:
+            for min_quantity, max_quantity in [(1, None), (2, 3)]:
+                yield {
+                    'allowed_products': PRODUCTS[:3] + ['Pakket'],
+                    'sort_order': sort_order,
+                    'start_date': start_date,
+                    'end_date': end_date,
+                    'min_quantity': min_quantity,
+                    'max_quantity': max_quantity,
+                }
+
+
+def engine_comparable_orders(df):
+    """Orders zonder paid_at die alleen de kolomgewijze engine kan lezen.
+
+    De rij-engine kent alleen de DATE_FORMATS; ISO 8601 en andere notaties uit het
+    vangnet van parse_paid_at zijn voor hem orders zonder datum.
+    """
+    text = df['paid_at'].astype(str).where(df['paid_at'].notna())
+    known_format = np.zeros(len(df), dtype=bool)
+    for fmt in DATE_FORMATS:
+        known_format |= pd.to_datetime(text, format=fmt, errors='coerce').notna().to_numpy()
+    fallback_only = parse_paid_at(df['paid_at']).notna().to_numpy() & ~known_format
+    return df[~fallback_only]
+
+
+def compare_label_engines(df):
+    """Draai beide label engines op alle scenario's; geef de tijden terug en faal bij verschillen.
+
+    Orders met een datum die alleen de kolomgewijze engine herkent doen niet mee
+    (zie engine_comparable_orders).
+    """
+    df = engine_comparable_orders(df)
+    timings = {'rows': 0.0, 'columnar': 0.0}
+    for scenario in label_engine_scenarios():
+        results = {}
+        for engine in timings:
+            start = time.perf_counter()
+            results[engine] = generate_shipping_labels(df, engine=engine, **scenario)
+            timings[engine] += time.perf_counter() - start
+        if results['rows'] != results['columnar']:
+            raise AssertionError(f"Label engines verschillen voor scenario {scenario}")
+    return timings
+
+
+def time_pdf_mode(labels, mode, directory, workers=None):
+    """Meet de tijd en bestandsgrootte van één PDF modus."""
+    output_file = os.path.join(directory, f"labels_{mode}_{len(labels)}.pdf")
+    start = time.perf_counter()
+    create_pdf_from_labels(labels, output_file, mode=mode, workers=workers)
+    elapsed = time.perf_counter() - start
+    size = os.path.getsize(output_file)
+    os.remove(output_file)
+    return elapsed, size
+
+
+def parse_size(text):
+    """Zet '10k', '1M' of '2500' om naar een aantal rijen."""
+    multipliers = {'k': 1000, 'm': 1000000}
+    suffix = text[-1].lower()
+    if suffix in multipliers:
+        return int(float(text[:-1]) * multipliers[suffix])
+    return int(text)
+
+
+def measure_stage(stages, name, measure_memory, func, *args, **kwargs):
+    """Voer één stap uit en leg wandkloktijd, CPU tijd en piekgeheugen (tracemalloc) vast."""
+    gc.collect()
+    if measure_memory:
+        tracemalloc.start()
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    try:
+        result = func(*args, **kwargs)
+    finally:
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+        peak = None
+        if measure_memory:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+    stages[name] = {'seconds': round(wall, 4), 'cpu_seconds': round(cpu, 4), 'peak_bytes': peak}
+    return result
+
+
+def run_pipeline(csv_path, directory, skip, measure_memory, pdf_mode, workers):
+    """Draai alle stappen van de app op één CSV bestand."""
+    stages = {}
+    counts = {}
+
+    df = measure_stage(stages, 'read_csv', measure_memory, read_csv_data, csv_path)
+    counts['csv_rows'] = len(df)
+
+    orders = measure_stage(stages, 'normalize', measure_memory, OrderFrame.from_dataframe, df)
+    del df
+
+    # Zelfde filters als de app standaard toont: alle producten, volledig datumbereik
+    products = [str(p) for p in orders.index.products if p and str(p) != 'nan']
+    mask = measure_stage(stages, 'filter', measure_memory, filter_orders,
+                         orders, products, date(2023, 1, 1), date(2025, 12, 31), 1, None, [], 'OR')
+    counts['filtered_orders'] = int(mask.sum())
+
+    labels = measure_stage(stages, 'generate_labels', measure_memory, generate_shipping_labels,
+                           orders.df, products)
+    counts['labels'] = len(labels)
+
+    if 'create_pdf' not in skip:
+        pdf_path = os.path.join(directory, 'labels.pdf')
+        measure_stage(stages, 'create_pdf', measure_memory, create_pdf_from_labels,
+                      labels, pdf_path, mode=pdf_mode, workers=workers)
+        counts['pdf_bytes'] = os.path.getsize(pdf_path)
+        os.remove(pdf_path)
+
+    if 'excel_export' not in skip:
+        excel_bytes = measure_stage(stages, 'excel_export', measure_memory, generate_excel_export, orders.view(mask))
+        counts['excel_bytes'] = len(excel_bytes)
+
+    return stages, counts
+
+
+def git_revision():
+    """Huidige git commit, of None buiten een git checkout."""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(sizes, skip, measure_memory, pdf_mode, workers, seed):
+    """Genereer per grootte een CSV en meet de pipeline; geeft het JSON rapport terug."""
+    report = {
+        'meta': {
+            'started_at': datetime.now().isoformat(timespec='seconds'),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'cpu_count': os.cpu_count(),
+            'pdf_mode': pdf_mode,
+            'memory_measured': measure_memory,
+        },
+        'runs': [],
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        for rows in sizes:
+            csv_path = os.path.join(directory, f"orders_{rows}.csv")
+            write_synthetic_csv(csv_path, rows, seed=seed)
+            stages, counts = run_pipeline(csv_path, directory, skip, measure_memory, pdf_mode, workers)
+            counts['csv_bytes'] = os.path.getsize(csv_path)
+            os.remove(csv_path)
+            report['runs'].append({'rows': rows, 'counts': counts, 'stages': stages})
+            print_run(rows, stages)
+    return report
+
+
+def format_bytes(value):
+    return '-' if value is None else f"{value / 1024 ** 2:.1f} MB"
+
+
+def print_run(rows, stages):
+    print(f"\n{rows} rijen")
+    print(f"{'stap':>16} {'seconden':>10} {'cpu':>10} {'piek':>12}")
+    for name, result in stages.items():
+        print(f"{name:>16} {result['seconds']:>10.2f} {result['cpu_seconds']:>10.2f} {format_bytes(result['peak_bytes']):>12}")
+
+
+def print_comparison(report, baseline):
+    """Toon per grootte en stap de verhouding ten opzichte van een eerder rapport."""
+    previous = {run['rows']: run['stages'] for run in baseline.get('runs', [])}
+    print(f"\nVergelijking met {baseline.get('meta', {}).get('git_revision') or 'vorig rapport'} (nieuw / oud)")
+    print(f"{'rijen':>10} {'stap':>16} {'tijd':>8} {'geheugen':>9}")
+    for run in report['runs']:
+        for name, result in run['stages'].items():
+            old = previous.get(run['rows'], {}).get(name)
+            if not old:
+                continue
+            time_ratio = result['seconds'] / old['seconds'] if old['seconds'] else float('nan')
+            if result['peak_bytes'] and old.get('peak_bytes'):
+                memory_ratio = f"{result['peak_bytes'] / old['peak_bytes']:.2f}x"
+            else:
+                memory_ratio = '-'
+            print(f"{run['rows']:>10} {name:>16} {time_ratio:>7.2f}x {memory_ratio:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de labelgenerator.")
+    parser.add_argument('--labels', type=int, nargs='*', default=[240, 2400, 24000],
+                        help="Aantal labels per PDF run")
+    parser.add_argument('--modes', nargs='+', default=PDF_MODES, choices=PDF_MODES,
+                        help="Te vergelijken PDF modi")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Aantal processen voor de parallelle modus (standaard: alle cores)")
+    parser.add_argument('--orders', type=int, nargs='*', default=[],
+                        help="Aantal synthetische orders voor de vergelijking van de label engines")
+    parser.add_argument('--suite', nargs='*', default=[],
+                        help="Groottes voor de pipeline benchmark, bijvoorbeeld 10k 100k 1M 5M")
+    parser.add_argument('--skip', nargs='+', default=[], choices=SUITE_STAGES,
+                        help="Stappen die de pipeline benchmark overslaat")
+    parser.add_argument('--pdf-mode', choices=PDF_MODES, default='parallel',
+                        help="PDF modus in de pipeline benchmark")
+    parser.add_argument('--no-memory', action='store_true',
+                        help="Geen piekgeheugen meten (tracemalloc vertraagt de stappen)")
+    parser.add_argument('--seed', type=int, default=42, help="Seed voor de synthetische data")
+    parser.add_argument('--json', default='benchmark_results.json',
+                        help="Bestand voor de resultaten van de pipeline benchmark")
+    parser.add_argument('--compare', default=None,
+                        help="Eerder JSON rapport om de pipeline resultaten mee te vergelijken")
+    args = parser.parse_args()
+
+    if args.labels:
+        print(f"{'labels':>8} {'modus':>12} {'seconden':>10} {'labels/s':>10} {'bytes':>12}")
+        with tempfile.TemporaryDirectory() as directory:
+            for count in args.labels:
+                labels = synthetic_labels(count)
+                for mode in args.modes:
+                    elapsed, size = time_pdf_mode(labels, mode, directory, workers=args.workers)
+                    rate = count / elapsed if elapsed > 0 else 0
+                    print(f"{count:>8} {mode:>12} {elapsed:>10.2f} {rate:>10.0f} {size:>12}")
+
+    if args.orders:
+        # Vergelijkt ook de uitvoer: de kolom-engine moet exact dezelfde labels opleveren
+        print(f"{'orders':>8} {'rows (s)':>10} {'columnar (s)':>13} {'versnelling':>12}")
+        for count in args.orders:
+            timings = compare_label_engines(synthetic_orders(count, seed=count))
+            speedup = timings['rows'] / timings['columnar'] if timings['columnar'] > 0 else 0
+            print(f"{count:>8} {timings['rows']:>10.2f} {timings['columnar']:>13.2f} {speedup:>11.1f}x")
+
+    if args.suite:
+        sizes = [parse_size(size) for size in args.suite]
+        report = run_suite(sizes, set(args.skip), not args.no_memory, args.pdf_mode, args.workers, args.seed)
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResultaten geschreven naar {args.json}")
+
+        if args.compare:
+            with open(args.compare, encoding='utf-8') as f:
+                print_comparison(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
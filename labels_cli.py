@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Batch modus - Verzendlabels Generator
+Genereer verzendlabels (PDF) en verzendadressen (Excel) zonder Streamlit, bijvoorbeeld
+voor de nachtelijke labelrun op een batch worker.
+
+Gebruik:
+    python labels_cli.py orders.csv --products "Boek deel 1" "Boek deel 2" --output-dir uit/
+    python labels_cli.py jan.csv feb.csv --start-date 2024-01-01 --end-date 2024-02-29 --logic AND
+    python labels_cli.py jaar.csv --products "Boek deel 1" --chunksize 100000
+    cat orders.csv | python labels_cli.py - --timings timings.json
+    python labels_cli.py vandaag.csv --store orders.sqlite
+    python labels_cli.py shop1.csv shop2.csv --merge
+
+Per invoerbestand worden een PDF en een Excel bestand geschreven (met --merge één PDF en
+Excel voor alle bestanden samen); een JSON overzicht met de tijden per stap gaat naar
+stdout (of naar --timings).
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import date, datetime
+from io import BytesIO
+
+from labels_pdf import DEFAULT_LABEL_TEMPLATE, LABEL_TEMPLATES
+from streamlit_labels_app import (
+    OrderFrame,
+    OrderStore,
+    create_pdf_from_labels,
+    filter_orders,
+    generate_excel_export,
+    generate_shipping_labels,
+    generate_shipping_labels_chunked,
+    merge_order_files,
+    read_csv_data,
+    read_order_files,
+)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Genereer verzendlabels en verzendadressen vanaf de commandline.")
+    parser.add_argument('inputs', nargs='+', help="CSV bestanden met orders; gebruik - voor stdin")
+    parser.add_argument('--products', nargs='+', default=None,
+                        help="Producten om mee te nemen (standaard: alle producten)")
+    parser.add_argument('--start-date', type=date.fromisoformat, default=None, help="Vanaf datum (JJJJ-MM-DD)")
+    parser.add_argument('--end-date', type=date.fromisoformat, default=None, help="Tot en met datum (JJJJ-MM-DD)")
+    parser.add_argument('--min-quantity', type=int, default=1, help="Minimaal aantal per order")
+    parser.add_argument('--max-quantity', type=int, default=None, help="Maximaal aantal per order")
+    parser.add_argument('--sort', dest='sort_order', choices=['newest_first', 'oldest_first'], default='newest_first',
+                        help="Sorteervolgorde van de labels op betaaldatum")
+    parser.add_argument('--logic', dest='product_logic', choices=['OR', 'AND'], default='OR',
+                        help="OR: minstens één product, AND: klant heeft alle producten (Excel export)")
+    parser.add_argument('--dedup', choices=['exact', 'fuzzy'], default='exact',
+                        help="Adresontdubbeling: exact, of fuzzy (ook bijna gelijke adressen samenvoegen)")
+    parser.add_argument('--names', nargs='+', default=None, help="Alleen deze personen (Excel export)")
+    parser.add_argument('--output-dir', default='.', help="Map voor de gegenereerde bestanden")
+    parser.add_argument('--pdf-mode', choices=['single_pass', 'parallel', 'merge'], default='parallel',
+                        help="PDF render modus")
+    parser.add_argument('--template', choices=list(LABEL_TEMPLATES), default=DEFAULT_LABEL_TEMPLATE,
+                        help="Labelvel voor de PDF")
+    parser.add_argument('--workers', type=int, default=None, help="Aantal processen voor de parallelle PDF modus")
+    parser.add_argument('--no-pdf', action='store_true', help="Geen verzendlabels PDF maken")
+    parser.add_argument('--no-excel', action='store_true', help="Geen Excel export maken")
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help="Lees de CSV in blokken van dit aantal rijen (alleen PDF, voor exports groter dan het geheugen; "
+                             "niet samen met --merge, --store, --dedup fuzzy of --names)")
+    parser.add_argument('--merge', action='store_true',
+                        help="Lees alle invoerbestanden tegelijk in en verwerk ze samen; dubbele orders tellen één keer")
+    parser.add_argument('--store', default=None,
+                        help="SQLite orderopslag: verwerk alleen orders die nog niet geprint zijn en markeer de orders op de labels daarna")
+    parser.add_argument('--timings', default=None, help="Schrijf het JSON overzicht naar dit bestand in plaats van stdout")
+    return parser.parse_args(argv)
+
+
+def open_input(path):
+    """Open een invoerbestand; '-' leest de volledige CSV van stdin."""
+    if path == '-':
+        return BytesIO(sys.stdin.buffer.read()), 'stdin'
+    return path, os.path.splitext(os.path.basename(path))[0]
+
+
+def stage_timer(stages):
+    """Functie die een stap uitvoert en de duur onder de naam van de stap in stages zet."""
+    def timed(stage, func, *func_args, **func_kwargs):
+        start = time.perf_counter()
+        result = func(*func_args, **func_kwargs)
+        stages[stage] = round(time.perf_counter() - start, 4)
+        return result
+    return timed
+
+
+def process_input(path, args, today):
+    """Verwerk één CSV bestand en geef een overzicht met tijden per stap terug."""
+    summary = {'input': path, 'stages': {}, 'outputs': {}}
+    timed = stage_timer(summary['stages'])
+
+    source, stem = open_input(path)
+    if args.chunksize:
+        return process_input_chunked(source, stem, args, today, summary, timed)
+
+    df = timed('read_csv', read_csv_data, source)
+    if df is None:
+        summary['error'] = "CSV bestand kon niet gelezen worden"
+        return summary
+    return process_orders(df, stem, args, today, summary, timed)
+
+
+def process_merged(paths, args, today):
+    """Lees alle CSV bestanden tegelijk in, voeg ze samen en verwerk ze als één bestand."""
+    summary = {'input': paths, 'stages': {}, 'outputs': {}}
+    timed = stage_timer(summary['stages'])
+
+    sources = [open_input(path) for path in paths]
+    results = timed('read_csv', read_order_files, [(stem, source) for source, stem in sources])
+    errors = {name: error for name, _, error in results if error is not None}
+    if errors:
+        summary['error'] = f"CSV bestand(en) konden niet gelezen worden: {errors}"
+        return summary
+
+    df, summary['merged_files'] = timed('merge_files', merge_order_files, [(name, df) for name, df, _ in results])
+    return process_orders(df, 'samengevoegd', args, today, summary, timed)
+
+
+def process_orders(df, stem, args, today, summary, timed):
+    """Filter de ingelezen orders en schrijf de PDF en Excel; vult summary aan."""
+    stages = summary['stages']
+    store = None
+    if args.store:
+        # Alleen de orders die nog niet eerder geprint zijn verder verwerken
+        store = OrderStore(args.store)
+        summary['store'] = timed('store_ingest', store.ingest, df)
+        df = timed('store_unprinted', store.unprinted)
+
+    orders = timed('normalize', OrderFrame.from_dataframe, df)
+    summary['rows'] = len(orders)
+    summary['memory_bytes'] = orders.memory_report
+
+    products = args.products
+    if products is None:
+        products = [str(p) for p in orders.index.products if p and str(p) != 'nan']
+
+    # Zonder datums geldt het volledige bereik, zoals de app standaard doet
+    mask = timed('filter', filter_orders, orders, products, args.start_date, args.end_date,
+                 args.min_quantity, args.max_quantity, args.names, args.product_logic)
+    summary['filtered_orders'] = int(mask.sum())
+
+    # Order hashes van de orders op de labels zijn alleen nodig om ze in de opslag te markeren
+    selected_orders = [] if store is not None else None
+    if not args.no_pdf:
+        merge_report = []
+        labels = timed('generate_labels', generate_shipping_labels,
+                       df=orders.df,
+                       allowed_products=products,
+                       sort_order=args.sort_order,
+                       start_date=datetime.combine(args.start_date, datetime.min.time()) if args.start_date else None,
+                       end_date=datetime.combine(args.end_date, datetime.max.time()) if args.end_date else None,
+                       min_quantity=args.min_quantity,
+                       max_quantity=args.max_quantity,
+                       dedup=args.dedup,
+                       merge_report=merge_report,
+                       selected_orders=selected_orders)
+        summary['labels'] = len(labels)
+        if args.dedup == 'fuzzy':
+            summary['merged_addresses'] = len(merge_report)
+        if labels:
+            pdf_path = os.path.join(args.output_dir, f"{stem}_verzendlabels_{today}.pdf")
+            timed('create_pdf', create_pdf_from_labels, labels, pdf_path, mode=args.pdf_mode, workers=args.workers, template=args.template)
+            summary['outputs']['pdf'] = pdf_path
+
+    if not args.no_excel and summary['filtered_orders'] > 0:
+        excel_bytes = timed('excel_export', generate_excel_export, orders.view(mask))
+        excel_path = os.path.join(args.output_dir, f"{stem}_verzendadressen_{today}.xlsx")
+        with open(excel_path, 'wb') as f:
+            f.write(excel_bytes)
+        summary['outputs']['excel'] = excel_path
+
+    # Alleen de orders die echt op een label in de PDF staan gelden als geprint
+    if store is not None and 'pdf' in summary['outputs']:
+        summary['store']['marked_printed'] = timed('store_mark_printed', store.mark_printed, selected_orders)
+
+    summary['total_seconds'] = round(sum(stages.values()), 4)
+    return summary
+
+
+def process_input_chunked(source, stem, args, today, summary, timed):
+    """Maak alleen de labels PDF, blok voor blok, zonder het hele bestand in te laden."""
+    if args.products is None:
+        summary['error'] = "--chunksize vereist --products"
+        return summary
+    if not args.no_excel:
+        print("Let op: --chunksize maakt geen Excel export", file=sys.stderr)
+
+    if not args.no_pdf:
+        labels = timed('generate_labels', generate_shipping_labels_chunked,
+                       source,
+                       allowed_products=args.products,
+                       sort_order=args.sort_order,
+                       start_date=datetime.combine(args.start_date, datetime.min.time()) if args.start_date else None,
+                       end_date=datetime.combine(args.end_date, datetime.max.time()) if args.end_date else None,
+                       min_quantity=args.min_quantity,
+                       max_quantity=args.max_quantity,
+                       chunksize=args.chunksize)
+        summary['labels'] = len(labels)
+        if labels:
+            pdf_path = os.path.join(args.output_dir, f"{stem}_verzendlabels_{today}.pdf")
+            timed('create_pdf', create_pdf_from_labels, labels, pdf_path, mode=args.pdf_mode, workers=args.workers, template=args.template)
+            summary['outputs']['pdf'] = pdf_path
+
+    summary['total_seconds'] = round(sum(summary['stages'].values()), 4)
+    return summary
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.chunksize:
+        # Blok voor blok lezen kent geen orderopslag, fuzzy ontdubbeling of naamfilter
+        unsupported = [flag for flag, used in (('--merge', args.merge and len(args.inputs) > 1),
+                                               ('--store', args.store),
+                                               ('--dedup fuzzy', args.dedup == 'fuzzy'),
+                                               ('--names', args.names)) if used]
+        if unsupported:
+            print(f"{', '.join(unsupported)} en --chunksize gaan niet samen", file=sys.stderr)
+            return 2
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    today = datetime.now().strftime('%Y-%m-%d')
+
+    started_at = datetime.now().isoformat(timespec='seconds')
+    run_start = time.perf_counter()
+    results = []
+    if args.merge and len(args.inputs) > 1:
+        print(f"Verwerken: {', '.join(args.inputs)} (samengevoegd)", file=sys.stderr)
+        results.append(process_merged(args.inputs, args, today))
+    else:
+        for path in args.inputs:
+            print(f"Verwerken: {path}", file=sys.stderr)
+            results.append(process_input(path, args, today))
+
+    report = {
+        'started_at': started_at,
+        'wall_seconds': round(time.perf_counter() - run_start, 4),
+        'files': results,
+    }
+    report_json = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.timings:
+        with open(args.timings, 'w', encoding='utf-8') as f:
+            f.write(report_json + '\n')
+    else:
+        print(report_json)
+
+    return 1 if any('error' in result for result in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
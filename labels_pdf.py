@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Labelvellen en PDF rendering - Verzendlabels Generator
+Velindelingen, tekst passen op labels en het tekenen van labelpagina's.
+
+Staat los van de Streamlit app, zodat de worker processen van de parallelle PDF modus
+render_pdf_chunk en LabelTemplate gewoon kunnen importeren (de app draait onder
+Streamlit als een telkens vervangen __main__ module).
+"""
+
+import functools
+from io import BytesIO
+from reportlab.lib.pagesizes import A4
+from reportlab.platypus import Table, TableStyle
+from reportlab.lib import colors
+from reportlab.lib.units import mm
+from reportlab.pdfgen import canvas
+from reportlab.pdfbase.pdfmetrics import stringWidth
+
+# Labelvel: 8 rijen × 3 kolommen op A4
+LABEL_ROWS = 8
+LABEL_COLS = 3
+LABELS_PER_PAGE = LABEL_ROWS * LABEL_COLS
+
+# Labeltekst: lettertype en -grootte van de tabel, kleinste grootte bij inkrimpen, celmaat
+LABEL_FONT_NAME = 'Helvetica'
+LABEL_FONT_SIZE = 10
+LABEL_MIN_FONT_SIZE = 6
+LABEL_FONT_STEP = 0.5
+LABEL_LEADING_RATIO = 1.2
+LABEL_CELL_WIDTH = 70 * mm
+LABEL_CELL_HEIGHT = 37.125 * mm
+# Ruimte die de witte rasterlijnen (2pt) van de cel afsnoepen
+LABEL_CELL_INSET = 2
+
+# ------------------------------
+# ANNULEREN
+# ------------------------------
+
+class JobCancelled(Exception):
+    """Een achtergrondtaak is geannuleerd."""
+
+def check_cancelled(cancel_event):
+    """Stop met JobCancelled als cancel_event gezet is."""
+    if cancel_event is not None and cancel_event.is_set():
+        raise JobCancelled()
+
+# ------------------------------
+# TEKST PASSEN OP LABELS
+# ------------------------------
+
+@functools.lru_cache(maxsize=65536)
+def text_width(text, font_name=LABEL_FONT_NAME, font_size=LABEL_FONT_SIZE):
+    """Breedte van tekst in punten; gecachet per (woord, lettertype, grootte)."""
+    return stringWidth(text, font_name, font_size)
+
+def wrap_text_to_width(text, max_width, font_name=LABEL_FONT_NAME, font_size=LABEL_FONT_SIZE):
+    """Breek tekst op woorden af zodat elke regel binnen max_width punten past.
+
+    Bestaande regeleinden blijven staan; een woord dat alleen al te breed is komt op
+    een eigen regel. Geeft de regels en de breedte van de breedste regel terug.
+    """
+    space = text_width(' ', font_name, font_size)
+    lines = []
+    widest = 0.0
+
+    for line in text.split('\n'):
+        current_words = []
+        current_width = 0.0
+        for word in line.split(' '):
+            width = text_width(word, font_name, font_size)
+            if current_words and current_width + space + width > max_width:
+                lines.append(' '.join(current_words))
+                widest = max(widest, current_width)
+                current_words = [word]
+                current_width = width
+            else:
+                current_width += (space if current_words else 0.0) + width
+                current_words.append(word)
+        lines.append(' '.join(current_words))
+        widest = max(widest, current_width)
+
+    return lines, widest
+
+def fit_label_text(text, max_width=LABEL_CELL_WIDTH - LABEL_CELL_INSET, max_height=LABEL_CELL_HEIGHT - LABEL_CELL_INSET,
+                   font_name=LABEL_FONT_NAME, font_size=LABEL_FONT_SIZE, min_font_size=LABEL_MIN_FONT_SIZE):
+    """Pas labeltekst op de echte tekstbreedte in een cel, zo nodig met een kleiner lettertype.
+
+    Geeft (tekst, lettergrootte, regelafstand) terug. Past de tekst zelfs op de kleinste
+    grootte niet, dan worden de onderste regels weggelaten.
+    """
+    if not text:
+        return text, font_size, font_size * LABEL_LEADING_RATIO
+
+    size = font_size
+    while True:
+        leading = size * LABEL_LEADING_RATIO
+        lines, widest = wrap_text_to_width(text, max_width, font_name, size)
+        if widest <= max_width and len(lines) * leading <= max_height:
+            return '\n'.join(lines), size, leading
+        if size - LABEL_FONT_STEP < min_font_size:
+            break
+        size -= LABEL_FONT_STEP
+
+    max_lines = max(1, int(max_height // leading))
+    return '\n'.join(lines[:max_lines]), size, leading
+
+# ------------------------------
+# LABELVEL TEMPLATES
+# ------------------------------
+
+class LabelTemplate:
+    """Indeling van een vel stickers: aantal rijen en kolommen, labelmaat, marges, tussenruimte en verschuiving.
+
+    Alle maten in punten (gebruik mm). Marges zijn die van het vel; offset_x/offset_y
+    verschuiven de hele indeling voor de kalibratie van een printer (positief = naar
+    rechts/omlaag). Kolombreedtes, rijhoogtes en de TableStyle worden één keer bij het
+    aanmaken berekend en daarna voor elke pagina hergebruikt.
+    """
+
+    def __init__(self, name, rows, cols, label_width, label_height, margin_left=0, margin_top=0,
+                 gap_x=0, gap_y=0, offset_x=0, offset_y=0, page_size=A4, font_size=LABEL_FONT_SIZE,
+                 description=''):
+        self.name = name
+        self.rows = rows
+        self.cols = cols
+        self.label_width = label_width
+        self.label_height = label_height
+        self.margin_left = margin_left
+        self.margin_top = margin_top
+        self.gap_x = gap_x
+        self.gap_y = gap_y
+        self.offset_x = offset_x
+        self.offset_y = offset_y
+        self.page_size = page_size
+        self.font_size = font_size
+        self.description = description
+        self.labels_per_page = rows * cols
+        self._compile()
+
+    def _compile(self):
+        """Bereken de tabelindeling en de gedeelde TableStyle."""
+        # Tussenruimtes worden lege kolommen/rijen tussen de labels
+        self._col_step = 2 if self.gap_x else 1
+        self._row_step = 2 if self.gap_y else 1
+        self.col_widths = self._with_gaps([self.label_width] * self.cols, self.gap_x)
+        self.row_heights = self._with_gaps([self.label_height] * self.rows, self.gap_y)
+        self.table_height = sum(self.row_heights)
+        self.text_width = self.label_width - LABEL_CELL_INSET
+        self.text_height = self.label_height - LABEL_CELL_INSET
+
+        # Positie van de tabel op de pagina (drawOn rekent vanaf de onderkant)
+        self.x = self.margin_left + self.offset_x
+        self.y = self.page_size[1] - self.margin_top - self.offset_y - self.table_height
+
+        # Stijl de tabel met GEEN padding
+        self.style = TableStyle([
+            # Cell borders (transparant voor sticker vellen)
+            ('GRID', (0, 0), (-1, -1), 2, colors.white),
+
+            # Tekst centrering
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+
+            # Tekst eigenschappen
+            ('FONTNAME', (0, 0), (-1, -1), LABEL_FONT_NAME),
+            ('FONTSIZE', (0, 0), (-1, -1), self.font_size),
+            ('LEADING', (0, 0), (-1, -1), self.font_size * LABEL_LEADING_RATIO),  # 1.2x font size voor optimale regelspatiëring
+            ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+
+            # ABSOLUUT GEEN padding of marges
+            ('LEFTPADDING', (0, 0), (-1, -1), 0),
+            ('RIGHTPADDING', (0, 0), (-1, -1), 0),
+            ('TOPPADDING', (0, 0), (-1, -1), 0),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 0),
+
+            # Geen extra spacing
+            ('NOSPLIT', (0, 0), (-1, -1)),
+
+            # Tabel niveau instellingen
+            ('ROWBACKGROUNDS', (0, 0), (-1, -1), [colors.white for _ in range(len(self.row_heights))]),
+        ])
+
+    @staticmethod
+    def _with_gaps(sizes, gap):
+        if not gap:
+            return sizes
+        result = []
+        for size in sizes:
+            if result:
+                result.append(gap)
+            result.append(size)
+        return result
+
+    def build_table(self, labels, start_index):
+        """Maak de tabel voor één pagina met labels vanaf start_index."""
+        table_data = [[''] * len(self.col_widths) for _ in self.row_heights]
+        # Afwijkende lettergrootte per cel voor labels die anders niet passen
+        cell_styles = []
+
+        end_index = min(start_index + self.labels_per_page, len(labels))
+        for label_index in range(start_index, end_index):
+            i, j = divmod(label_index - start_index, self.cols)
+            row, col = i * self._row_step, j * self._col_step
+
+            # Pas het label op de echte tekstbreedte in de cel, zo nodig kleiner
+            label_text, font_size, leading = fit_label_text(
+                labels[label_index], max_width=self.text_width, max_height=self.text_height, font_size=self.font_size
+            )
+            table_data[row][col] = label_text
+            if font_size != self.font_size:
+                cell_styles.append(('FONTSIZE', (col, row), (col, row), font_size))
+                cell_styles.append(('LEADING', (col, row), (col, row), leading))
+
+        table = Table(table_data, colWidths=self.col_widths, rowHeights=self.row_heights)
+        table.setStyle(self.style)
+        if cell_styles:
+            table.setStyle(TableStyle(cell_styles))
+        return table
+
+    def draw_table(self, pdf_canvas, table):
+        """Teken een paginatabel op de positie van het vel."""
+        table.wrapOn(pdf_canvas, self.page_size[0], self.page_size[1])
+        table.drawOn(pdf_canvas, self.x, self.y)
+
+# Beschikbare velindelingen; a4_3x8 is de oorspronkelijke indeling zonder marges
+LABEL_TEMPLATES = {
+    template.name: template for template in [
+        LabelTemplate('a4_3x8', rows=LABEL_ROWS, cols=LABEL_COLS, label_width=LABEL_CELL_WIDTH,
+                      label_height=LABEL_CELL_HEIGHT, description="A4, 3×8 labels van 70×37,125 mm (standaard)"),
+        LabelTemplate('avery_3x7', rows=7, cols=3, label_width=63.5 * mm, label_height=38.1 * mm,
+                      margin_left=7.2 * mm, margin_top=15.15 * mm, gap_x=2.5 * mm,
+                      description="A4, 3×7 labels van 63,5×38,1 mm (Avery L7160)"),
+        LabelTemplate('avery_2x8', rows=8, cols=2, label_width=99.1 * mm, label_height=33.9 * mm,
+                      margin_left=4.65 * mm, margin_top=12.9 * mm, gap_x=2.5 * mm,
+                      description="A4, 2×8 labels van 99,1×33,9 mm (Avery L7162)"),
+        LabelTemplate('avery_4x10', rows=10, cols=4, label_width=45.7 * mm, label_height=25.4 * mm,
+                      margin_left=9.7 * mm, margin_top=21.5 * mm, gap_x=2.5 * mm,
+                      description="A4, 4×10 labels van 45,7×25,4 mm (Avery L7654)"),
+    ]
+}
+DEFAULT_LABEL_TEMPLATE = 'a4_3x8'
+
+def get_label_template(template=None):
+    """Geef een LabelTemplate terug voor een naam, een template of None (standaard)."""
+    if template is None:
+        return LABEL_TEMPLATES[DEFAULT_LABEL_TEMPLATE]
+    if isinstance(template, LabelTemplate):
+        return template
+    if template not in LABEL_TEMPLATES:
+        raise ValueError(f"Onbekend labelvel: {template}")
+    return LABEL_TEMPLATES[template]
+
+def create_table_with_labels(labels, start_index, template=None):
+    """Maak een tabel met labels vanaf start_index (standaard 8x3)."""
+    return get_label_template(template).build_table(labels, start_index)
+
+# ------------------------------
+# LABELPAGINA'S TEKENEN
+# ------------------------------
+
+def draw_label_pages(pdf_canvas, labels, template=None, progress=None, cancel_event=None):
+    """Teken alle labelpagina's direct op één canvas, zonder tijdelijke bestanden.
+
+    progress(pagina's klaar, totaal) wordt na elke pagina aangeroepen; als cancel_event
+    gezet is stopt het tekenen met JobCancelled.
+    """
+    template = get_label_template(template)
+    pages_total = (len(labels) + template.labels_per_page - 1) // template.labels_per_page
+    for page, start_index in enumerate(range(0, len(labels), template.labels_per_page), start=1):
+        check_cancelled(cancel_event)
+        table = template.build_table(labels, start_index)
+        template.draw_table(pdf_canvas, table)
+        pdf_canvas.showPage()
+        if progress is not None:
+            progress(page, pages_total)
+
+def create_pdf_single_pass(labels, output_file, template=None, progress=None, cancel_event=None):
+    """Maak het PDF document in één doorgang op één canvas (geen temp-bestanden, geen merge)."""
+    template = get_label_template(template)
+    pdf_canvas = canvas.Canvas(output_file, pagesize=template.page_size)
+    draw_label_pages(pdf_canvas, labels, template, progress=progress, cancel_event=cancel_event)
+    pdf_canvas.save()
+    return output_file
+
+def render_pdf_chunk(labels_chunk, template=None):
+    """Render een pagina-uitgelijnd blok labels naar PDF bytes (draait in een worker proces)."""
+    buffer = BytesIO()
+    create_pdf_single_pass(labels_chunk, buffer, template)
+    return buffer.getvalue()
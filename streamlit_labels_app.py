@@ -7,23 +7,349 @@ Upload CSV bestand en genereer verzendlabels als PDF
 
 import streamlit as st
 import pandas as pd
+import numpy as np
 import tempfile
+import shutil
+import hashlib
+import threading
 import os
+import time
+import json
+import logging
+import functools
+import inspect
+import multiprocessing
+import tracemalloc
+import sqlite3
+import re
+import unicodedata
+import difflib
+import bisect
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from collections import OrderedDict
-from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, PageTemplate, Frame
-from reportlab.lib import colors
-from reportlab.lib.units import mm
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from reportlab.platypus import SimpleDocTemplate, PageTemplate, Frame
 from PyPDF2 import PdfMerger
 from io import BytesIO
+from openpyxl import Workbook
+from openpyxl.utils import get_column_letter
+
+from labels_pdf import (
+    DEFAULT_LABEL_TEMPLATE,
+    LABEL_TEMPLATES,
+    LABELS_PER_PAGE,
+    JobCancelled,
+    check_cancelled,
+    create_pdf_single_pass,
+    get_label_template,
+    render_pdf_chunk,
+)
+
+# Ondersteunde paid_at formaten, in volgorde van voorkeur
+DATE_FORMATS = ['%Y-%m-%d %H:%M:%S', '%Y-%m-%d', '%d-%m-%Y %H:%M:%S', '%d-%m-%Y']
+# Vangnet voor waarden die in geen van de DATE_FORMATS passen (pandas herkenning per waarde,
+# dag vóór maand); tijden met een tijdzone worden omgezet naar de lokale tijd van de webshop
+DATE_FALLBACK_FORMATS = ['ISO8601', 'mixed']
+DATE_TIMEZONE = 'Europe/Amsterdam'
+DATE_OFFSET_PATTERN = r'\d:\d{2}(?::\d{2}(?:[.,]\d+)?)?\s*(?:Z|[+-]\d{2}(?::?\d{2})?)$'
+
+# Aantal waarden waarmee de aanwezige datumformaten worden bepaald
+DATE_SAMPLE_SIZE = 1000
+
+# Kolom met de vooraf geparste paid_at waarden
+PAID_AT_PARSED = 'paid_at_dt'
+
+# Kolommen die de CSV export hoort te bevatten
+ORDER_COLUMNS = [
+    'company', 'firstname', 'lastname', 'street', 'housenumber', 'housenumber_suffix',
+    'zipcode', 'city', 'country_code', 'product', 'quantity', 'paid_at',
+    'amount_with_tax', 'email', 'payment_method',
+]
+
+# Vooraf samengestelde labelkolommen van een OrderFrame
+LABEL_NAME = 'label_name'
+LABEL_ADDRESS = 'label_address'
+LABEL_POSTAL = 'label_postal'
+ADDRESS_KEY = 'address_key'
+
+# Compacte kolomtypes bij het inlezen: deze kolommen worden categorisch als ze weinig
+# verschillende waarden hebben (hoogstens deze fractie van het aantal rijen)
+CATEGORICAL_COLUMNS = ['product', 'city', 'country_code', 'payment_method', 'company', 'zipcode']
+CATEGORICAL_MAX_RATIO = 0.5
+
+# Meerdere uploads: aantal CSV bestanden dat tegelijk ingelezen wordt
+UPLOAD_READ_WORKERS = os.cpu_count() or 1
+
+# Limieten van de ingestie cache (gedeeld door alle sessies op de server)
+INGEST_CACHE_MAX_ENTRIES = 8
+INGEST_CACHE_MAX_BYTES = 2 * 1024 ** 3
+
+# Fuzzy adresontdubbeling: minimale gelijkenis (difflib ratio) van de naam én van de voornaam
+# binnen hetzelfde postcode/huisnummer blok, en maximaal aantal varianten per blok dat vergeleken wordt
+FUZZY_DEDUP_THRESHOLD = 0.85
+FUZZY_DEDUP_MAX_BLOCK = 50
+
+# Blokgrootte en tekstkolommen voor het blok-voor-blok inlezen van grote CSV exports
+CSV_CHUNK_ROWS = 100000
+CHUNK_TEXT_COLUMNS = [
+    'company', 'firstname', 'lastname', 'street', 'housenumber_suffix',
+    'zipcode', 'city', 'product', 'paid_at', 'email',
+]
+
+# Naamfilter: maximaal aantal zoekresultaten in de keuzelijst
+NAME_SEARCH_LIMIT = 50
+
+# Orderoverzicht: rijen per pagina en de kolommen waarop gesorteerd kan worden (op getypeerde waarden)
+ORDER_TABLE_PAGE_SIZES = [25, 50, 100, 250]
+ORDER_TABLE_SORT_COLUMNS = {
+    'Betaaldatum': PAID_AT_PARSED,
+    'Bedrag (incl. BTW)': 'amount_with_tax',
+    'Aantal': 'quantity_clean',
+    'Naam': 'full_name',
+    'Product': 'product',
+    'Plaats': 'city',
+    'E-mail': 'email',
+}
+ORDER_TABLE_SEARCH_COLUMNS = ['full_name', 'email', 'company', 'city', 'product']
+
+# Lokale orderopslag (SQLite) voor het verwerken van alleen nieuwe orders
+ORDER_STORE_PATH = os.environ.get('LABELS_ORDER_STORE', 'verzendlabels_orders.sqlite')
+ORDER_HASH = 'order_hash'
+
+# Export cache op schijf (PDF, Excel, CSV), gedeeld door alle sessies op de server
+ARTIFACT_CACHE_DIR = os.environ.get('LABELS_ARTIFACT_CACHE', os.path.join(tempfile.gettempdir(), 'verzendlabels_exports'))
+ARTIFACT_CACHE_MAX_ENTRIES = 200
+ARTIFACT_CACHE_MAX_BYTES = 1024 ** 3
+# Versie van de exports in de cache: ophogen bij elke wijziging aan de inhoud of het formaat
+# van een export, zodat bestanden van vóór een deploy niet meer worden uitgeleverd
+ARTIFACT_CACHE_VERSION = 3
+
+# Aantal orders per blok bij de streaming Excel export
+EXCEL_CHUNK_ROWS = 10000
+
+# Instrumentatie: standaard aan via LABELS_DIAGNOSTICS=1, logregels via de logger hieronder
+DIAGNOSTICS_DEFAULT = os.environ.get('LABELS_DIAGNOSTICS', '') == '1'
+STAGE_LOGGER = logging.getLogger('verzendlabels.stages')
+_active_stage_recorder = threading.local()
+
+# Achtergrondtaken: maximaal aantal gelijktijdige taken per server (de rest wacht in de rij)
+# en hoe vaak de voortgang ververst wordt
+JOB_MAX_CONCURRENT = int(os.environ.get('LABELS_MAX_JOBS', '2'))
+JOB_POLL_SECONDS = 0.5
+
+# Onder dit aantal labels is een process pool duurder dan serieel renderen
+PARALLEL_MIN_LABELS = 100 * LABELS_PER_PAGE
+
+# Startmethode van de PDF worker processen vanuit de app: de Streamlit server draait veel
+# threads, dus geen fork; de workers importeren render_pdf_chunk schoon uit labels_pdf
+APP_PDF_START_METHOD = 'spawn'
+# Aantal PDF worker processen in de app (LABELS_PDF_WORKERS, standaard het aantal cores)
+APP_PDF_WORKERS = int(os.environ.get('LABELS_PDF_WORKERS', '0')) or None
+
+# PDF's van de app worden in het geheugen gemaakt; boven deze grootte wijkt de buffer uit
+# naar een naamloos tijdelijk bestand (dat bij het sluiten vanzelf verdwijnt)
+PDF_SPOOL_MAX_BYTES = 8 * 1024 ** 2
+
+# ------------------------------
+# INSTRUMENTATIE
+# ------------------------------
+
+@st.cache_resource
+def get_tracemalloc_lock():
+    """Eén lock per server voor het meten van piekgeheugen.
+
+    tracemalloc is procesbreed: start, stop en reset_peak gelden voor alle sessies en
+    threads tegelijk, dus er meet steeds maar één recorder het geheugen.
+    """
+    return threading.Lock()
+
+class StageRecorder:
+    """Verzamelt per pipelinestap wandkloktijd, CPU tijd, aantallen rijen en piekgeheugen.
+
+    Eén recorder per rerun; stappen worden alleen gemeten als de recorder actief is in
+    de huidige thread, zodat uitgeschakelde instrumentatie vrijwel niets kost.
+
+    Het piekgeheugen komt van tracemalloc en is dat van het hele serverproces (ook
+    allocaties van andere sessies en achtergrondtaken tellen mee). Meet al een andere
+    recorder het geheugen, dan meet deze recorder het niet (memory_busy).
+    """
+
+    def __init__(self, track_memory=False, log_stages=False):
+        self.track_memory = track_memory
+        self.log_stages = log_stages
+        if log_stages:
+            enable_stage_logging()
+        self.records = []
+        self.deferred = []
+        self._stack = []
+        self._started_tracemalloc = False
+        self._memory_lock = None
+        self.memory_busy = False
+
+    def __enter__(self):
+        _active_stage_recorder.recorder = self
+        if self.track_memory:
+            memory_lock = get_tracemalloc_lock()
+            if memory_lock.acquire(blocking=False):
+                self._memory_lock = memory_lock
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                    self._started_tracemalloc = True
+            else:
+                # Een andere recorder meet al; meten zou elkaars piek resetten
+                self.track_memory = False
+                self.memory_busy = True
+        return self
+
+    def __exit__(self, *exc_info):
+        _active_stage_recorder.recorder = None
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+        if self._memory_lock is not None:
+            self._memory_lock.release()
+            self._memory_lock = None
+        return False
+
+    @contextmanager
+    def stage(self, name, rows_in=None):
+        """Meet één stap; de yielded record mag aangevuld worden (bijvoorbeeld rows_out)."""
+        record = {'stage': name, 'rows_in': rows_in, 'rows_out': None}
+        frame = {'peak': 0, 'start': 0}
+        if self.track_memory and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            if self._stack:
+                # Piek tot nu toe bewaren voor de omliggende stap
+                self._stack[-1]['peak'] = max(self._stack[-1]['peak'], peak)
+            tracemalloc.reset_peak()
+            frame['start'] = current
+        self._stack.append(frame)
+
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            yield record
+        finally:
+            record['wall_seconds'] = round(time.perf_counter() - wall_start, 4)
+            record['cpu_seconds'] = round(time.thread_time() - cpu_start, 4)
+            self._stack.pop()
+            record['peak_bytes'] = None
+            if self.track_memory and tracemalloc.is_tracing():
+                peak = max(frame['peak'], tracemalloc.get_traced_memory()[1])
+                record['peak_bytes'] = max(0, peak - frame['start'])
+                if self._stack:
+                    self._stack[-1]['peak'] = max(self._stack[-1]['peak'], peak)
+            self.records.append(record)
+            if self.log_stages:
+                STAGE_LOGGER.info(json.dumps(record))
+
+    def defer(self, name, rows=None, estimated_seconds=None):
+        """Noteer een export die deze rerun niet gebouwd is, met de geschatte bouwtijd."""
+        self.deferred.append({'export': name, 'rows': rows, 'estimated_seconds': estimated_seconds})
+
+def enable_stage_logging():
+    """Laat STAGE_LOGGER INFO regels naar stderr (de server log) schrijven.
+
+    Zonder handler en met het standaardniveau WARNING zouden de stappen nergens
+    verschijnen. De handler wordt één keer per proces toegevoegd; de logger is gedeeld
+    door alle reruns en sessies.
+    """
+    if not STAGE_LOGGER.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('%(asctime)s %(name)s %(levelname)s %(message)s'))
+        STAGE_LOGGER.addHandler(handler)
+        STAGE_LOGGER.propagate = False
+    STAGE_LOGGER.setLevel(logging.INFO)
+
+def active_stage_recorder():
+    """De recorder van de huidige thread, of None als instrumentatie uit staat."""
+    return getattr(_active_stage_recorder, 'recorder', None)
+
+def count_rows(value):
+    """Aantal rijen van een DataFrame, lijst of mask; None voor andere waarden."""
+    if isinstance(value, np.ndarray) and value.dtype == bool:
+        return int(np.count_nonzero(value))
+    if isinstance(value, (pd.DataFrame, pd.Series, list, tuple, OrderFrame)):
+        return len(value)
+    return None
+
+def instrumented_stage(name, rows_arg=0):
+    """Decorator die een functie als pipelinestap meet als er een recorder actief is."""
+    def decorator(func):
+        signature = inspect.signature(func)
+        rows_param = list(signature.parameters)[rows_arg]
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            recorder = active_stage_recorder()
+            if recorder is None:
+                return func(*args, **kwargs)
+            rows_in = count_rows(signature.bind_partial(*args, **kwargs).arguments.get(rows_param))
+            with recorder.stage(name, rows_in=rows_in) as record:
+                result = func(*args, **kwargs)
+                record['rows_out'] = count_rows(result)
+            return result
+        return wrapper
+    return decorator
+
+@contextmanager
+def optional_stage(name, rows_in=None):
+    """Meet een blok code als stap als er een recorder actief is, anders niets."""
+    recorder = active_stage_recorder()
+    if recorder is None:
+        yield {}
+        return
+    with recorder.stage(name, rows_in=rows_in) as record:
+        yield record
+
+def show_diagnostics_panel(recorder):
+    """Inklapbaar paneel met de gemeten stappen van deze rerun."""
+    with st.expander("Diagnostiek", expanded=False):
+        if recorder.memory_busy:
+            st.caption("Piekgeheugen niet gemeten: een andere sessie meet al (tracemalloc is procesbreed).")
+        show_deferred_exports(recorder.deferred)
+        if recorder.records:
+            diagnostics = stage_table(recorder.records)
+            st.dataframe(diagnostics, hide_index=True, width='stretch')
+            st.caption(f"Totaal gemeten: {diagnostics['wall_seconds'].sum():.3f} s "
+                       f"(stappen kunnen genest zijn; CPU tijd is die van de script thread).")
+        else:
+            st.caption("Geen stappen gemeten in deze rerun.")
+        show_job_stages(st.session_state.get('background_jobs', {}))
+
+def stage_table(records):
+    """Gemeten stappen als tabel, met het piekgeheugen in MB."""
+    diagnostics = pd.DataFrame(records)
+    diagnostics['peak_MB'] = diagnostics['peak_bytes'].astype(float) / 1024 ** 2
+    return diagnostics.drop(columns=['peak_bytes'])
+
+def show_job_stages(jobs):
+    """Gemeten stappen van de laatste achtergrondtaak per soort (labels, Excel)."""
+    records = [{'taak': kind, **record} for kind, job in jobs.items() for record in job.stages]
+    if not records:
+        return
+    st.caption("Achtergrondtaken (laatste taak per soort; CPU tijd is die van de taak thread):")
+    st.dataframe(stage_table(records), hide_index=True, width='stretch')
+
+def show_deferred_exports(deferred):
+    """Toon welke exports deze rerun niet gebouwd zijn en hoeveel tijd dat naar schatting scheelt."""
+    if not deferred:
+        return
+    estimates = [item['estimated_seconds'] for item in deferred if item['estimated_seconds'] is not None]
+    parts = [
+        f"{item['export']} ~{item['estimated_seconds']:.2f} s" if item['estimated_seconds'] is not None
+        else f"{item['export']} (nog niet gemeten)"
+        for item in deferred
+    ]
+    st.caption(f"Uitgestelde exports: {', '.join(parts)}; naar schatting {sum(estimates):.2f} s bespaard in deze rerun.")
 
 # ------------------------------
 # FUNCTIES UIT ORIGINELE SCRIPT
 # ------------------------------
 
-def generate_excel_export(df_filtered):
-    """Genereer Excel bestand met de juiste kolommen voor verzending."""
+def generate_excel_export_pandas(df_filtered):
+    """Genereer Excel bestand via pd.ExcelWriter (oorspronkelijke methode, alles in geheugen)."""
     # Maak een kopie om origineel niet te wijzigen
     df_copy = df_filtered.copy()
 
@@ -93,6 +419,104 @@ def generate_excel_export(df_filtered):
 
     return output.getvalue()
 
+def parse_repeat_count(value):
+    """Aantal Excel rijen voor een order: int(float(quantity)), minimaal 1."""
+    try:
+        return max(1, int(float(value)))
+    except (ValueError, TypeError, OverflowError):
+        return 1
+
+def format_excel_housenumber(value):
+    """Huisnummer zonder decimalen voor de Excel export."""
+    return str(int(value)) if isinstance(value, (int, float)) else str(value)
+
+def format_excel_suffix(value):
+    """Huisnummertoevoeging voor de Excel export."""
+    return str(value) if str(value) != 'nan' else ''
+
+def build_excel_data(df):
+    """Zet orders kolomgewijs om naar de Excel kolommen voor verzending (één rij per order)."""
+    excel_data = pd.DataFrame(index=df.index)
+
+    excel_data['Bedrijfsnaam'] = df['company'].astype(object).fillna('')
+    excel_data['Bedrijfsnaam2'] = ''  # Niet beschikbaar in CSV
+    excel_data['Afdeling'] = ''  # Niet beschikbaar in CSV
+    excel_data['Geslacht'] = ''  # Niet beschikbaar in CSV
+
+    # Voorletters afleiden van firstname (eerste letter + punt)
+    firstname = df['firstname'].astype(str)
+    has_firstname = df['firstname'].notna() & (firstname.str.strip() != '')
+    excel_data['Voorletters'] = (firstname.str[0].str.upper() + '.').where(has_firstname, '').astype(object)
+
+    excel_data['Achternaam'] = df['lastname'].astype(object).fillna('')
+    excel_data['Postadres'] = df['street'].astype(object).fillna('')
+    excel_data['Huisnummer'] = map_unique_values(df['housenumber'], format_excel_housenumber)
+    excel_data['Huisnummertoevoeging'] = map_unique_values(df['housenumber_suffix'], format_excel_suffix)
+    excel_data['Postcode'] = df['zipcode'].astype(object).fillna('')
+    excel_data['Plaats'] = df['city'].astype(object).fillna('')
+    excel_data['Landcode'] = df['country_code'].astype(object).fillna('')
+    excel_data['Emailadres'] = df['email'].astype(object).fillna('')
+
+    return excel_data
+
+def excel_column_widths(excel_data):
+    """Kolombreedtes (langste waarde of kop + 2) met gevectoriseerde stringlengtes."""
+    widths = []
+    for column in excel_data.columns:
+        values = excel_data[column]
+        lengths = values.astype(str).str.len().where(values.astype(bool), 0)
+        max_length = max(len(column), int(lengths.max()) if len(lengths) else 0)
+        widths.append(max_length + 2)
+    return widths
+
+def generate_excel_export_streaming(df_filtered, chunk_size=EXCEL_CHUNK_ROWS, progress=None, cancel_event=None):
+    """Genereer het Excel bestand met een write-only werkmap.
+
+    Rijen worden per blok van chunk_size orders uitgebreid naar hun aantal en direct
+    weggeschreven, zodat de volledig uitgebreide tabel nooit in het geheugen staat.
+    progress(klaar, totaal) wordt na elk blok aangeroepen; cancel_event breekt af.
+    """
+    excel_data = build_excel_data(df_filtered)
+    repeat_counts = map_unique_values(df_filtered['quantity'], parse_repeat_count, na_value=1).to_numpy(dtype='int64')
+
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet('Verzendadressen')
+
+    # Breedtes moeten in write-only modus vóór de eerste rij gezet worden
+    for position, width in enumerate(excel_column_widths(excel_data), start=1):
+        worksheet.column_dimensions[get_column_letter(position)].width = width
+
+    worksheet.append(list(excel_data.columns))
+
+    # Herhaal elke rij op basis van quantity, blok voor blok
+    for start in range(0, len(excel_data), chunk_size):
+        check_cancelled(cancel_event)
+        chunk = excel_data.iloc[start:start + chunk_size]
+        expanded = chunk.loc[chunk.index.repeat(repeat_counts[start:start + chunk_size])]
+        for row in expanded.itertuples(index=False, name=None):
+            worksheet.append([value if value != '' else None for value in row])
+        if progress is not None:
+            progress(min(start + chunk_size, len(excel_data)), len(excel_data))
+
+    output = BytesIO()
+    workbook.save(output)
+    return output.getvalue()
+
+@instrumented_stage('excel_export')
+def generate_excel_export(df_filtered, mode='streaming', progress=None, cancel_event=None):
+    """Genereer Excel bestand met de juiste kolommen voor verzending.
+
+    mode='streaming' schrijft blok voor blok met een write-only werkmap (met
+    voortgang en annuleren), mode='pandas' gebruikt de oorspronkelijke
+    pd.ExcelWriter methode.
+    """
+    if mode == 'streaming':
+        return generate_excel_export_streaming(df_filtered, progress=progress, cancel_event=cancel_event)
+    if mode == 'pandas':
+        return generate_excel_export_pandas(df_filtered)
+    raise ValueError(f"Onbekende Excel modus: {mode}")
+
+@instrumented_stage('read_csv')
 def read_csv_data(file):
     """Lees het CSV-bestand en retourneer de data als pandas DataFrame."""
     try:
@@ -163,44 +587,8 @@ def should_include_product(product, allowed_products):
 
     return product.strip() in allowed_products
 
-def truncate_text_for_cell(text, max_chars_per_line=40):
-    """Breek tekst af om binnen een cel te passen, maar knip nooit volledige adressen af."""
-    if not text:
-        return text
-
-    lines = text.split('\n')
-    result_lines = []
-
-    for line in lines:
-        if len(line) <= max_chars_per_line:
-            result_lines.append(line)
-        else:
-            # Breek lange lijnen af op woorden, maar bewaar alle tekst
-            words = line.split(' ')
-            current_line = []
-            current_length = 0
-
-            for word in words:
-                if current_length + len(word) + (1 if current_line else 0) <= max_chars_per_line:
-                    current_line.append(word)
-                    current_length += len(word) + (1 if current_line else 0)
-                else:
-                    if current_line:
-                        result_lines.append(' '.join(current_line))
-                    current_line = [word]
-                    current_length = len(word)
-
-            if current_line:
-                result_lines.append(' '.join(current_line))
-
-    # Beperk aantal regels maar alleen als er echt te veel is (bijv. > 6 regels)
-    if len(result_lines) <= 6:
-        return '\n'.join(result_lines)
-    else:
-        return '\n'.join(result_lines[:6])  # Knip alleen af bij extreem lange tekst
-
-def generate_shipping_labels(df, allowed_products, sort_order='newest_first', start_date=None, end_date=None, min_quantity=1, max_quantity=None):
-    """Genereer verzendlabels van de CSV data met filters."""
+def generate_shipping_labels_rows(df, allowed_products, sort_order='newest_first', start_date=None, end_date=None, min_quantity=1, max_quantity=None):
+    """Genereer verzendlabels rij voor rij (oorspronkelijke implementatie, referentie voor de kolom-engine)."""
     # Zet DataFrame om naar lijst van dictionaries
     data = df.to_dict('records')
 
@@ -301,87 +689,517 @@ def generate_shipping_labels(df, allowed_products, sort_order='newest_first', st
 
     return labels
 
-def create_table_with_labels(labels, start_index):
-    """Maak een 8x3 tabel met labels vanaf start_index."""
+# ------------------------------
+# DATUM PARSING
+# ------------------------------
 
-    # A4 afmetingen: 210mm x 297mm
-    # 8 rijen en 3 kolommen - exacte berekening voor volledige pagina vulling
-    col_widths = [70*mm, 70*mm, 70*mm]    # 210mm / 3 = 70mm per kolom
-    row_heights = [37.125*mm] * 8        # 297mm / 8 = 37.125mm per rij
+def detect_date_formats(values, sample_size=DATE_SAMPLE_SIZE):
+    """Bepaal met een steekproef welke DATE_FORMATS in de kolom voorkomen."""
+    sample = values.dropna().astype(str)
+    if len(sample) > sample_size:
+        # Gelijkmatig verdeelde steekproef over de hele kolom
+        sample = sample.iloc[np.linspace(0, len(sample) - 1, sample_size).astype(int)]
+
+    detected = []
+    for fmt in DATE_FORMATS:
+        if sample.empty:
+            break
+        attempt = pd.to_datetime(sample, format=fmt, errors='coerce')
+        if attempt.notna().any():
+            detected.append(fmt)
+            sample = sample[attempt.isna()]
+    return detected
+
+def parse_paid_at(values):
+    """Parse een datumkolom per formaatgroep in één gevectoriseerde stap per formaat.
+
+    Eerst worden de formaten uit de steekproef geprobeerd; waarden die daarna nog
+    niet geparsed zijn krijgen de overige DATE_FORMATS en tot slot ISO 8601 en vrije
+    herkenning (zie parse_fallback_dates, bijv. '2024-01-05T10:00:00'). Niet te parsen
+    waarden worden NaT.
+    """
+    text = values.astype(str).where(values.notna())
+    parsed = pd.Series(pd.NaT, index=values.index, dtype='datetime64[us]')
+
+    detected = detect_date_formats(values)
+    formats = detected + [fmt for fmt in DATE_FORMATS if fmt not in detected]
+    for fmt in formats:
+        remaining = parsed.isna() & text.notna()
+        if not remaining.any():
+            break
+        attempt = pd.to_datetime(text[remaining], format=fmt, errors='coerce')
+        parsed[remaining] = attempt.astype('datetime64[us]')
+
+    for fmt in DATE_FALLBACK_FORMATS:
+        remaining = parsed.isna() & text.notna()
+        if not remaining.any():
+            break
+        parsed[remaining] = parse_fallback_dates(text[remaining], fmt)
+    return parsed
+
+def parse_fallback_dates(text, fmt):
+    """Parse tekst met een vangnet formaat uit DATE_FALLBACK_FORMATS.
+
+    Vrije herkenning leest dag vóór maand ('05/01/2024' is 5 januari), net als de
+    DATE_FORMATS. Waarden met een tijdzone ('Z', '+01:00') worden omgezet naar de
+    lokale tijd in DATE_TIMEZONE, zodat een order op dezelfde dag blijft als in de webshop.
+    """
+    options = {'dayfirst': True} if fmt == 'mixed' else {}
+    parsed = pd.Series(pd.NaT, index=text.index, dtype='datetime64[us]')
+    with_offset = text.str.contains(DATE_OFFSET_PATTERN, regex=True).to_numpy(dtype=bool)
+    if (~with_offset).any():
+        attempt = pd.to_datetime(text[~with_offset], format=fmt, errors='coerce', **options)
+        parsed[~with_offset] = attempt.astype('datetime64[us]')
+    if with_offset.any():
+        attempt = pd.to_datetime(text[with_offset], format=fmt, errors='coerce', utc=True, **options)
+        parsed[with_offset] = attempt.dt.tz_convert(DATE_TIMEZONE).dt.tz_localize(None).astype('datetime64[us]')
+    return parsed
 
-    # Maak tabel data (8 rijen, 3 kolommen) met echte labels
-    table_data = []
+# ------------------------------
+# KOLOMGEWIJZE LABEL ENGINE
+# ------------------------------
+
+def map_unique_values(series, func, na_value=''):
+    """Pas func één keer per unieke waarde toe en verspreid het resultaat over alle rijen."""
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    mapped = np.array([func(value) for value in uniques] + [na_value], dtype=object)
+    # Code -1 (ontbrekende waarde) wijst naar de laatste positie: na_value
+    return pd.Series(mapped[codes], index=series.index)
+
+def clean_text_column(series):
+    """Kolomvariant van: str(x).strip() als x gevuld en niet leeg is, anders ''."""
+    text = series.astype(str).str.strip()
+    return text.where(series.notna(), '').astype(object)
+
+def format_housenumber_value(value):
+    """Huisnummer zonder decimalen, gelijk aan format_address."""
+    if isinstance(value, (int, float)):
+        return str(int(value)) if value == int(value) else str(value).rstrip('.0')
+    return str(value).strip()
+
+def parse_quantity_value(value):
+    """int(quantity) zoals in generate_shipping_labels_rows, of None als dat niet lukt."""
+    try:
+        return int(value)
+    except (ValueError, TypeError):
+        return None
+
+def build_label_columns(df):
+    """Bouw de naam-, adres- en postcoderegels van de labels voor alle rijen tegelijk."""
+    company = clean_text_column(df['company'])
+    firstname = clean_text_column(df['firstname'])
+    lastname = clean_text_column(df['lastname'])
+
+    # Naam: bedrijf (met persoonlijke naam eronder) of alleen de persoonlijke naam
+    personal_name = firstname + ' ' + lastname
+    has_company = (company != '') & (company != 'nan')
+    has_personal = (firstname != '') & (lastname != '')
+
+    name = personal_name.str.strip().astype(object)
+    name[has_company] = company[has_company]
+
+    check = has_company & has_personal
+    if check.any():
+        company_lower = company[check].str.lower().to_numpy(dtype=str)
+        personal_lower = personal_name[check].str.lower().to_numpy(dtype=str)
+        not_in_company = np.char.find(company_lower, personal_lower) < 0
+        add_personal = check.copy()
+        add_personal[check] = not_in_company
+        name[add_personal] = company[add_personal] + '\n' + personal_name[add_personal]
+
+    # Adres: straat + huisnummer + toevoeging
+    street = clean_text_column(df['street'])
+    housenumber = map_unique_values(df['housenumber'], format_housenumber_value)
+    suffix = clean_text_column(df['housenumber_suffix'])
+    suffix = suffix.where(suffix != 'nan', '')
+    address = (street + ' ' + housenumber + suffix).str.strip()
+
+    # Postcode en plaats
+    postal = (clean_text_column(df['zipcode']) + ' ' + clean_text_column(df['city'])).str.strip()
+
+    return name, address, postal
+
+def select_label_rows(df, allowed_products, start_date=None, end_date=None, min_quantity=1, max_quantity=None, with_order_hashes=False):
+    """Posities van de rijen die door het product-, aantal- en datumfilter komen, met hun sorteersleutel.
+
+    De sorteersleutel is paid_at in microseconden; rijen zonder datum krijgen de kleinste
+    waarde en gelden dus als oudste. Met with_order_hashes=True komt daar de ORDER_HASH
+    van elke rij bij (uit de kolom, of berekend als die ontbreekt).
+    """
+    # Filter op toegestane producten
+    product = df['product']
+    product_text = product.astype(str)
+    mask = (product.notna() & (product_text != '') & (product_text != 'nan') &
+            product_text.str.strip().isin(list(allowed_products))).to_numpy()
+
+    # Filter op hoeveelheid; ongeldige waarden tellen als 1 zonder maximum check
+    if 'quantity' in df.columns:
+        quantity = df['quantity']
+        if pd.api.types.is_numeric_dtype(quantity) and not pd.api.types.is_bool_dtype(quantity):
+            values = np.trunc(quantity.to_numpy(dtype=float, na_value=1))
+            valid = np.ones(len(df), dtype=bool)
+        else:
+            parsed = map_unique_values(quantity, parse_quantity_value, na_value=1)
+            valid = parsed.notna().to_numpy()
+            values = parsed.fillna(1).to_numpy(dtype=float)
+        keep = (values > 0) & (values >= min_quantity)
+        if max_quantity is not None:
+            keep = keep & (values <= max_quantity)
+        mask = mask & np.where(valid, keep, 1 >= min_quantity)
+    elif 1 < min_quantity:
+        mask = np.zeros(len(df), dtype=bool)
+
+    # Datums parsen voor filter en sortering (of de al geparste kolom gebruiken)
+    if PAID_AT_PARSED in df.columns:
+        paid_at = df[PAID_AT_PARSED].astype('datetime64[us]')
+    elif 'paid_at' in df.columns:
+        paid_at = parse_paid_at(df['paid_at'])
+    else:
+        paid_at = pd.Series(pd.NaT, index=df.index, dtype='datetime64[us]')
+
+    if start_date or end_date:
+        mask = mask & paid_at.notna().to_numpy()
+        if start_date:
+            mask = mask & (paid_at >= pd.Timestamp(start_date)).to_numpy()
+        if end_date:
+            mask = mask & (paid_at <= pd.Timestamp(end_date)).to_numpy()
+
+    rows = np.flatnonzero(mask)
+    sort_keys = paid_at.to_numpy(dtype='datetime64[us]').view('int64')[rows]
+    sort_keys = np.where(sort_keys == np.iinfo(np.int64).min, np.iinfo(np.int64).min + 1, sort_keys)
+    if with_order_hashes:
+        if ORDER_HASH in df.columns:
+            order_hashes = df[ORDER_HASH].to_numpy(dtype=object)[rows]
+        else:
+            order_hashes = compute_order_hashes(df.iloc[rows]).to_numpy()
+        return rows, sort_keys, order_hashes
+    return rows, sort_keys
+
+def label_lines_for_rows(df, rows):
+    """Naam-, adres- en postcoderegels plus adressleutel voor de opgegeven rijposities."""
+    selected = df.iloc[rows]
+    if ADDRESS_KEY in df.columns:
+        return selected[LABEL_NAME], selected[LABEL_ADDRESS], selected[LABEL_POSTAL], selected[ADDRESS_KEY]
+    name, address, postal = build_label_columns(selected)
+    return name, address, postal, name + '|' + address + '|' + postal
 
-    for i in range(8):  # 8 rijen
-        row = []
-        for j in range(3):  # 3 kolommen
-            label_index = start_index + (i * 3) + j
+# ------------------------------
+# FUZZY ADRESONTDUBBELING
+# ------------------------------
 
-            if label_index < len(labels):
-                # Gebruik het echte label met tekst truncatie voor optimale celgrootte
-                label_text = truncate_text_for_cell(labels[label_index])
-                row.append(label_text)
+def normalize_key_value(value):
+    """Vergelijkingsvorm van tekst: zonder accenten, kleine letters, alleen letters/cijfers met enkele spaties."""
+    text = unicodedata.normalize('NFKD', str(value)).encode('ascii', 'ignore').decode('ascii').lower()
+    return re.sub(r'[^a-z0-9]+', ' ', text).strip()
+
+def normalize_key_column(series, compact=False):
+    """normalize_key_value per unieke waarde; compact=True laat ook de spaties weg ('1 A' -> '1a')."""
+    normalized = map_unique_values(series, normalize_key_value)
+    normalized = normalized.where(normalized != 'nan', '')
+    if compact:
+        normalized = map_unique_values(normalized, lambda value: value.replace(' ', ''))
+    return normalized
+
+def find_fuzzy_duplicates(df, rows, threshold=FUZZY_DEDUP_THRESHOLD, max_block=FUZZY_DEDUP_MAX_BLOCK):
+    """Zoek rijen die hetzelfde adres zijn als een eerdere rij, op kleine varianten na.
+
+    rows zijn de rijposities in de gewenste volgorde; de eerste rij van een adres blijft
+    staan. Twee stappen:
+    1. gelijk na normalisatie (hoofdletters, spaties, leestekens, accenten, '1A' vs '1 a');
+    2. binnen hetzelfde blok (genormaliseerde postcode + huisnummer + toevoeging) een
+       difflib vergelijking van de naam tegen de rijen die al blijven staan. Huisgenoten
+       delen adres en vaak achternaam, dus de straat telt niet mee en ook de voornamen
+       moeten de drempel halen (Anna en Anne de Vries blijven twee labels).
+    Door de blokken blijft het aantal vergelijkingen ongeveer lineair.
+
+    Geeft een boolean array (welke van rows blijven staan) en een lijst met
+    samengevoegde rijen terug.
+    """
+    selected = df.iloc[rows]
+    name, address, postal, _ = label_lines_for_rows(df, rows)
+
+    zipcode = normalize_key_column(selected['zipcode'], compact=True)
+    housenumber = normalize_key_column(map_unique_values(selected['housenumber'], format_housenumber_value), compact=True)
+    suffix = normalize_key_column(selected['housenumber_suffix'], compact=True)
+    city = normalize_key_column(selected['city'], compact=True)
+    street = normalize_key_column(selected['street'])
+    person = normalize_key_column(name)
+    firstname = normalize_key_column(selected['firstname'])
+
+    # Zonder postcode wordt op plaats geblokt
+    block = zipcode.where(zipcode != '', '@' + city) + '|' + housenumber + suffix
+    normalized_key = block + '|' + person.str.replace(' ', '', regex=False) + '|' + street.str.replace(' ', '', regex=False)
+
+    block = block.to_numpy()
+    normalized_key = normalized_key.to_numpy()
+    compare_text = person.to_numpy()
+    first_names = firstname.to_numpy()
+    labels = (name + '\n' + address + '\n' + postal).to_numpy()
+    row_labels = selected.index.to_numpy()
+
+    keep = np.ones(len(rows), dtype=bool)
+    merged = []
+
+    def merge(position, kept_position, reason, score):
+        keep[position] = False
+        merged.append({
+            'behouden_rij': row_labels[kept_position],
+            'samengevoegde_rij': row_labels[position],
+            'behouden_label': labels[kept_position],
+            'samengevoegd_label': labels[position],
+            'reden': reason,
+            'score': round(score, 3),
+        })
+
+    # Stap 1: gelijk na normalisatie
+    first_of_key = {}
+    for position, key in enumerate(normalized_key):
+        kept_position = first_of_key.setdefault(key, position)
+        if kept_position != position:
+            merge(position, kept_position, 'genormaliseerd', 1.0)
+
+    # Stap 2: fuzzy binnen blokken met meer dan één overgebleven variant
+    remaining = np.flatnonzero(keep)
+    codes, _ = pd.factorize(block[remaining])
+    counts = np.bincount(codes)
+    multi = counts[codes] > 1
+    candidates = remaining[multi]
+    candidate_codes = codes[multi]
+    order = np.argsort(candidate_codes, kind='stable')
+    candidates = candidates[order]
+    boundaries = np.flatnonzero(np.diff(candidate_codes[order])) + 1
+
+    def similarity(a, b):
+        matcher = difflib.SequenceMatcher(None, a, b, autojunk=False)
+        if matcher.real_quick_ratio() < threshold or matcher.quick_ratio() < threshold:
+            return 0.0
+        return matcher.ratio()
+
+    for group in np.split(candidates, boundaries):
+        if len(group) < 2 or len(group) > max_block:
+            continue
+        leaders = []
+        for position in group:
+            best_leader, best_score = None, 0.0
+            for leader in leaders:
+                score = similarity(compare_text[leader], compare_text[position])
+                if score < threshold or score <= best_score:
+                    continue
+                if first_names[leader] != first_names[position] and similarity(first_names[leader], first_names[position]) < threshold:
+                    continue
+                best_leader, best_score = leader, score
+            if best_leader is None:
+                leaders.append(position)
             else:
-                # Geen label meer beschikbaar
-                row.append('')
+                merge(position, best_leader, 'fuzzy', best_score)
 
-        table_data.append(row)
+    return keep, merged
 
-    # Maak de tabel met GEEN extra ruimte of padding
-    table = Table(
-        table_data,
-        colWidths=col_widths,
-        rowHeights=row_heights
-    )
+def generate_shipping_labels_columnar(df, allowed_products, sort_order='newest_first', start_date=None, end_date=None, min_quantity=1, max_quantity=None, dedup='exact', merge_report=None, selected_orders=None):
+    """Genereer verzendlabels met pandas/NumPy kolomoperaties in plaats van een lus per rij.
 
-    # Stijl de tabel met GEEN padding
-    table.setStyle(TableStyle([
-        # Cell borders (transparant voor sticker vellen)
-        ('GRID', (0, 0), (-1, -1), 2, colors.white),
+    De uitvoer is identiek aan generate_shipping_labels_rows, behalve dat rijen zonder
+    product worden overgeslagen in plaats van een fout te geven en dat datums buiten de
+    DATE_FORMATS (ISO 8601 e.d., zie parse_paid_at) hier wel herkend worden; de rij-engine
+    behandelt die orders als orders zonder datum.
 
-        # Tekst centrering
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    dedup='fuzzy' voegt daarna ook adressen samen die alleen in schrijfwijze verschillen
+    (zie find_fuzzy_duplicates); de samengevoegde rijen worden aan merge_report
+    toegevoegd als dat een lijst is.
 
-        # Tekst eigenschappen - geoptimaliseerd voor 70mm x 37.125mm cellen
-        ('FONTSIZE', (0, 0), (-1, -1), 10),  # Verder verhoogd voor betere leesbaarheid
-        ('LEADING', (0, 0), (-1, -1), 12),  # 1.2x font size voor optimale regelspatiëring
-        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+    Is selected_orders een lijst, dan komt daar de ORDER_HASH bij van elke order die op
+    een label staat, ook als zijn adres met dat van een andere order is samengevoegd.
+    """
+    if dedup not in ('exact', 'fuzzy'):
+        raise ValueError(f"Onbekende ontdubbeling: {dedup}")
 
-        # ABSOLUUT GEEN padding of marges
-        ('LEFTPADDING', (0, 0), (-1, -1), 0),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 0),
-        ('TOPPADDING', (0, 0), (-1, -1), 0),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 0),
+    if selected_orders is None:
+        rows, sort_keys = select_label_rows(df, allowed_products, start_date, end_date, min_quantity, max_quantity)
+    else:
+        rows, sort_keys, order_hashes = select_label_rows(df, allowed_products, start_date, end_date, min_quantity,
+                                                          max_quantity, with_order_hashes=True)
+        selected_orders.extend(order_hashes)
+    if not len(rows):
+        return []
+
+    # Sorteer stabiel op paid_at
+    if sort_order == 'newest_first':
+        rows = rows[np.argsort(-sort_keys, kind='stable')]
+    else:
+        rows = rows[np.argsort(sort_keys, kind='stable')]
+
+    # Labelregels alleen voor de geselecteerde rijen opbouwen (of vooraf samengesteld gebruiken)
+    name, address, postal, address_key = label_lines_for_rows(df, rows)
+
+    # Unieke adressen: eerste voorkomen in de gesorteerde volgorde wint
+    first_occurrence = ~address_key.duplicated(keep='first')
+
+    if dedup == 'fuzzy':
+        unique_rows = rows[first_occurrence.to_numpy()]
+        keep, merged = find_fuzzy_duplicates(df, unique_rows)
+        first_occurrence[first_occurrence.to_numpy()] = keep
+        if merge_report is not None:
+            merge_report.extend(merged)
+
+    labels = name[first_occurrence] + '\n' + address[first_occurrence] + '\n' + postal[first_occurrence]
+    return labels.tolist()
+
+@instrumented_stage('generate_labels')
+def generate_shipping_labels(df, allowed_products, sort_order='newest_first', start_date=None, end_date=None, min_quantity=1, max_quantity=None, engine='columnar', dedup='exact', merge_report=None, selected_orders=None):
+    """Genereer verzendlabels van de CSV data met filters.
+
+    engine='columnar' gebruikt de kolomgewijze implementatie, engine='rows' de
+    oorspronkelijke lus per rij. dedup='fuzzy' (alleen columnar) voegt ook bijna
+    gelijke adressen samen; selected_orders (alleen columnar) verzamelt de order
+    hashes van de orders op de labels.
+    """
+    if engine == 'columnar':
+        return generate_shipping_labels_columnar(df, allowed_products, sort_order=sort_order, start_date=start_date,
+                                                 end_date=end_date, min_quantity=min_quantity, max_quantity=max_quantity,
+                                                 dedup=dedup, merge_report=merge_report, selected_orders=selected_orders)
+    if engine == 'rows':
+        if dedup != 'exact':
+            raise ValueError("Fuzzy ontdubbeling is alleen beschikbaar in de columnar engine")
+        if selected_orders is not None:
+            raise ValueError("selected_orders is alleen beschikbaar in de columnar engine")
+        return generate_shipping_labels_rows(df, allowed_products, sort_order=sort_order, start_date=start_date,
+                                             end_date=end_date, min_quantity=min_quantity, max_quantity=max_quantity)
+    raise ValueError(f"Onbekende label engine: {engine}")
 
-        # Geen extra spacing
-        ('NOSPLIT', (0, 0), (-1, -1)),
+# ------------------------------
+# CHUNKED INGESTIE
+# ------------------------------
 
-        # Tabel niveau instellingen
-        ('ROWBACKGROUNDS', (0, 0), (-1, -1), [colors.white for _ in range(8)]),
-    ]))
+def iter_csv_chunks(file, chunksize=CSV_CHUNK_ROWS):
+    """Lees een CSV in blokken van chunksize rijen; tekstkolommen worden als tekst gelezen.
+
+    Vaste tekst-dtypes voorkomen dat een kolom (bijvoorbeeld postcode) per blok anders
+    geïnterpreteerd wordt.
+    """
+    text_columns = {column: str for column in CHUNK_TEXT_COLUMNS}
+    for chunk in pd.read_csv(file, chunksize=chunksize, dtype=text_columns):
+        for column in ORDER_COLUMNS:
+            if column not in chunk.columns:
+                chunk[column] = pd.Series(np.nan, index=chunk.index, dtype=object)
+        yield chunk
+
+def merge_label_candidates(best, candidates, newest_first):
+    """Houd per adressleutel alleen de kandidaat die in de gesorteerde volgorde eerst komt."""
+    combined = candidates if best is None else pd.concat([best, candidates], ignore_index=True)
+    combined = combined.sort_values(
+        ['sort_key', 'position'],
+        ascending=[not newest_first, True],
+        kind='stable'
+    )
+    return combined.drop_duplicates('address_key', keep='first')
+
+@instrumented_stage('generate_labels_chunked')
+def generate_shipping_labels_chunked(file, allowed_products, sort_order='newest_first', start_date=None, end_date=None, min_quantity=1, max_quantity=None, chunksize=CSV_CHUNK_ROWS):
+    """Genereer verzendlabels rechtstreeks uit een CSV, blok voor blok.
+
+    Filters worden per blok toegepast en ontdubbeling gebeurt incrementeel: per adres
+    blijft alleen de rij over die in de gesorteerde volgorde als eerste zou komen. Het
+    geheugengebruik hangt daardoor af van de blokgrootte en het aantal unieke adressen,
+    niet van de bestandsgrootte. De uitvoer is gelijk aan generate_shipping_labels op
+    het volledige bestand, op voorloopnullen in volledig numerieke tekstkolommen na
+    (die blijven hier behouden).
+    """
+    newest_first = sort_order == 'newest_first'
+    best = None
+    offset = 0
+
+    for chunk in iter_csv_chunks(file, chunksize):
+        rows, sort_keys = select_label_rows(chunk, allowed_products, start_date, end_date, min_quantity, max_quantity)
+        if len(rows):
+            name, address, postal, address_key = label_lines_for_rows(chunk, rows)
+            candidates = pd.DataFrame({
+                'sort_key': sort_keys,
+                'position': rows + offset,
+                'address_key': address_key.to_numpy(),
+                'label': (name + '\n' + address + '\n' + postal).to_numpy(),
+            })
+            best = merge_label_candidates(best, candidates, newest_first)
+        offset += len(chunk)
+
+    if best is None:
+        return []
+    return best['label'].tolist()
+
+def pdf_buffer(max_size=PDF_SPOOL_MAX_BYTES):
+    """Schrijfbare buffer voor een PDF: in het geheugen tot max_size bytes, daarboven op schijf."""
+    return tempfile.SpooledTemporaryFile(max_size=max_size, mode='w+b')
+
+def create_pdf_parallel(labels, output_file, workers=None, min_labels=PARALLEL_MIN_LABELS, template=None, progress=None, cancel_event=None,
+                        start_method=None):
+    """Render de labelpagina's verdeeld over een process pool en voeg ze op volgorde samen.
+
+    Kleine runs (minder dan min_labels) of workers=1 worden gewoon serieel gerenderd.
+    Voortgang wordt per gerenderd blok gemeld; bij annuleren worden de resterende
+    blokken niet meer gestart. start_method kiest hoe de worker processen starten
+    ('spawn', 'forkserver' of 'fork'; standaard die van het platform).
+    """
+    template = get_label_template(template)
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(labels) < min_labels:
+        return create_pdf_single_pass(labels, output_file, template, progress=progress, cancel_event=cancel_event)
+
+    # Pagina-uitgelijnde blokken, een paar per worker voor een gelijkmatige verdeling
+    labels_per_page = template.labels_per_page
+    pages_needed = (len(labels) + labels_per_page - 1) // labels_per_page
+    pages_per_chunk = max(1, -(-pages_needed // (workers * 4)))
+    chunk_size = pages_per_chunk * labels_per_page
+    chunks = [labels[i:i + chunk_size] for i in range(0, len(labels), chunk_size)]
+
+    # executor.map levert de resultaten in de oorspronkelijke volgorde op
+    with optional_stage('render_pdf_chunks', rows_in=len(labels)):
+        mp_context = multiprocessing.get_context(start_method) if start_method else None
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks)), mp_context=mp_context) as executor:
+            parts = []
+            try:
+                for part in executor.map(render_pdf_chunk, chunks, [template] * len(chunks)):
+                    parts.append(part)
+                    check_cancelled(cancel_event)
+                    if progress is not None:
+                        progress(min(len(parts) * pages_per_chunk, pages_needed), pages_needed)
+            except JobCancelled:
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise
+
+    with optional_stage('merge_pdf', rows_in=len(parts)):
+        merger = PdfMerger()
+        for part in parts:
+            merger.append(BytesIO(part))
+        merger.write(output_file)
+        merger.close()
 
-    return table
+    return output_file
 
-def create_pdf_from_labels(labels, output_file):
-    """Maak het volledige PDF document met alle labels."""
+def create_pdf_merged(labels, output_file, template=None):
+    """Maak het PDF document per pagina als los document en voeg ze samen (oude methode).
 
-    # Bereken hoeveel pagina's nodig zijn (24 labels per pagina: 8×3)
-    labels_per_page = 8 * 3
+    De losse pagina's blijven in het geheugen, zodat output_file ook een buffer mag zijn.
+    """
+    label_template = get_label_template(template)
+
+    # Bereken hoeveel pagina's nodig zijn (standaard 24 labels per pagina: 8×3)
+    labels_per_page = label_template.labels_per_page
     pages_needed = (len(labels) + labels_per_page - 1) // labels_per_page
 
     # Maak alle tabellen
     tables = []
     for page_num in range(pages_needed):
         start_index = page_num * labels_per_page
-        table = create_table_with_labels(labels, start_index)
+        table = label_template.build_table(labels, start_index)
         tables.append(table)
 
+    page_buffers = []
     for i, table in enumerate(tables):
-        # Maak een tijdelijk document voor elke pagina
+        # Maak een los document voor elke pagina
+        page_buffer = BytesIO()
+        page_buffers.append(page_buffer)
         temp_doc = SimpleDocTemplate(
-            output_file.replace('.pdf', f'_temp_{i}.pdf'),
-            pagesize=A4,
+            page_buffer,
+            pagesize=label_template.page_size,
             leftMargin=0,
             rightMargin=0,
             topMargin=0,
@@ -392,11 +1210,10 @@ def create_pdf_from_labels(labels, output_file):
         def on_page(canvas, _):
             canvas.saveState()
             canvas.resetTransforms()
-            table.wrapOn(canvas, A4[0], A4[1])
-            table.drawOn(canvas, 0, 0)
+            label_template.draw_table(canvas, table)
             canvas.restoreState()
 
-        frame = Frame(0, 0, A4[0], A4[1], leftPadding=0, rightPadding=0,
+        frame = Frame(0, 0, label_template.page_size[0], label_template.page_size[1], leftPadding=0, rightPadding=0,
                       topPadding=0, bottomPadding=0)
 
         template = PageTemplate(id=f'page_{i}', frames=[frame], onPage=on_page)
@@ -408,76 +1225,1382 @@ def create_pdf_from_labels(labels, output_file):
     # Combineer alle PDF's
     merger = PdfMerger()
 
-    for i in range(len(tables)):
-        temp_file = output_file.replace('.pdf', f'_temp_{i}.pdf')
-        merger.append(temp_file)
+    for page_buffer in page_buffers:
+        page_buffer.seek(0)
+        merger.append(page_buffer)
 
     merger.write(output_file)
     merger.close()
 
-    # Verwijder tijdelijke bestanden
-    for i in range(len(tables)):
-        temp_file = output_file.replace('.pdf', f'_temp_{i}.pdf')
-        if os.path.exists(temp_file):
-            os.remove(temp_file)
-
     return output_file
 
+@instrumented_stage('create_pdf')
+def create_pdf_from_labels(labels, output_file, mode='single_pass', workers=None, template=None, progress=None, cancel_event=None,
+                           start_method=None):
+    """Maak het volledige PDF document met alle labels.
+
+    mode='single_pass' tekent alle pagina's op één canvas, mode='parallel' verdeelt
+    de pagina's over `workers` processen en mode='merge' gebruikt de oude methode
+    met een los document per pagina (in het geheugen) en PdfMerger. template kiest het labelvel
+    (naam uit LABEL_TEMPLATES of een LabelTemplate; standaard a4_3x8). progress en
+    cancel_event worden alleen door single_pass en parallel ondersteund; start_method
+    alleen door parallel.
+    """
+    if mode == 'single_pass':
+        return create_pdf_single_pass(labels, output_file, template, progress=progress, cancel_event=cancel_event)
+    if mode == 'parallel':
+        return create_pdf_parallel(labels, output_file, workers=workers, template=template,
+                                   progress=progress, cancel_event=cancel_event, start_method=start_method)
+    if mode == 'merge':
+        return create_pdf_merged(labels, output_file, template)
+    raise ValueError(f"Onbekende PDF modus: {mode}")
+
 # ------------------------------
-# TAB FUNCTIES
+# ORDER MODEL EN INGESTIE CACHE
 # ------------------------------
 
+def arrow_string_dtype():
+    """String dtype met Arrow opslag en NaN voor ontbrekende waarden, of None zonder pyarrow."""
+    try:
+        return pd.StringDtype('pyarrow', na_value=np.nan)
+    except TypeError:
+        # pandas 2.1 en 2.2 kennen deze dtype onder een eigen naam
+        try:
+            return pd.StringDtype('pyarrow_numpy')
+        except (ImportError, ValueError):
+            return None
+    except ImportError:
+        return None
 
-def show_overview_and_buttons(df, selected_products, sort_order, start_date, end_date, min_quantity, max_quantity, selected_names, product_logic):
-    """Toon het overzicht met beide knoppen op dezelfde pagina."""
-
-    # Maak een kopie van de dataframe voor filtering
-    df_filtered = df.copy()
-
-    # Converteer betaaldatum naar datetime
-    df_filtered['paid_at'] = pd.to_datetime(df_filtered['paid_at'], errors='coerce')
-
-    # Voeg full_name toe voor naam filtering
-    df_filtered['full_name'] = df_filtered.apply(lambda row: f"{str(row.get('firstname', '')).strip()} {str(row.get('lastname', '')).strip()}".strip(), axis=1)
-
-    # Pas filters toe
-    # Datum filter
-    if start_date and end_date:
-        df_filtered = df_filtered[
-            (df_filtered['paid_at'].dt.date >= start_date) &
-            (df_filtered['paid_at'].dt.date <= end_date)
-        ]
+def compact_dtypes(df):
+    """Zet de kolommen van df om naar compactere types zonder waarden te veranderen.
+
+    - CATEGORICAL_COLUMNS met weinig verschillende waarden worden categorisch
+    - gehele getallen krijgen het kleinste integer type waar alle waarden in passen
+    - overige tekstkolommen (object) worden Arrow strings als pyarrow beschikbaar is
+    Kommagetallen blijven float64: bedragen zijn in float32 niet exact.
+    """
+    string_dtype = arrow_string_dtype()
+    for column in df.columns:
+        series = df[column]
+        if column in CATEGORICAL_COLUMNS and series.nunique() <= CATEGORICAL_MAX_RATIO * len(series):
+            df[column] = series.astype('category')
+        elif pd.api.types.is_integer_dtype(series) and isinstance(series.dtype, np.dtype):
+            df[column] = pd.to_numeric(series, downcast='integer')
+        elif series.dtype == object and string_dtype is not None and pd.api.types.infer_dtype(series) == 'string':
+            df[column] = series.astype(string_dtype)
+    return df
+
+def parse_quantity_clean_value(value):
+    """Aantal zoals getoond in het overzicht: alleen gehele cijferreeksen, anders 1."""
+    return int(value) if str(value).isdigit() else 1
+
+class OrderIndex:
+    """Eenmalig per upload opgebouwde indexen voor de filters.
+
+    - productcodes per rij, waaruit de bitmap van een productselectie gemaakt wordt
+    - een gesorteerde datumindex voor bereikqueries op de betaaldatum
+    - een histogramindex op quantity_clean (rijen gegroepeerd per aantal)
+    - klantcodes (email) voor de klant × product incidentiematrix van de AND logica
+
+    Filtercombinaties worden beantwoord door bitmaps te combineren in plaats van
+    de hele DataFrame opnieuw te scannen.
+    """
+
+    def __init__(self, df):
+        self.row_count = len(df)
+
+        # Productcodes per rij (geen bitmap per product: dat kost producten × rijen bytes)
+        self.product_codes, products = pd.factorize(df['product'], use_na_sentinel=True)
+        self.products = list(products)
+        self.product_code_of = {product: code for code, product in enumerate(self.products)}
+
+        # Klantcodes per rij; de volledige incidentiematrix wordt bij eerste gebruik opgebouwd
+        self.customer_codes, customers = pd.factorize(df['email'], use_na_sentinel=True)
+        self.customer_count = len(customers)
+        self._incidence = None
+
+        # Gesorteerde datumindex (rijen zonder datum doen niet mee)
+        paid_at = df[PAID_AT_PARSED].to_numpy(dtype='datetime64[us]')
+        dated_rows = np.flatnonzero(~np.isnat(paid_at))
+        self.date_order = dated_rows[np.argsort(paid_at[dated_rows], kind='stable')]
+        self.date_values = paid_at[self.date_order]
+
+        # Histogramindex op aantal: rijen gesorteerd per waarde met begin-offsets per waarde
+        quantity = df['quantity_clean'].to_numpy()
+        self.quantity_order = np.argsort(quantity, kind='stable')
+        self.quantity_values, quantity_counts = np.unique(quantity, return_counts=True)
+        self.quantity_offsets = np.concatenate([[0], np.cumsum(quantity_counts)])
+
+    def memory_usage(self):
+        """Geheugengebruik van de indexen in bytes."""
+        arrays = [self.product_codes, self.customer_codes, self.date_order, self.date_values,
+                  self.quantity_order, self.quantity_values, self.quantity_offsets]
+        if self._incidence is not None:
+            arrays.append(self._incidence)
+        return sum(array.nbytes for array in arrays)
+
+    def rows_to_bitmap(self, rows):
+        """Zet een array met rijnummers om naar een bitmap."""
+        bitmap = np.zeros(self.row_count, dtype=bool)
+        bitmap[rows] = True
+        return bitmap
+
+    def product_bitmap(self, products):
+        """Bitmap van rijen met een van de opgegeven producten."""
+        codes = [self.product_code_of[product] for product in products if product in self.product_code_of]
+        return np.isin(self.product_codes, codes)
+
+    def date_bitmap(self, start_date, end_date):
+        """Bitmap van rijen met een betaaldatum van start_date t/m end_date (op dag).
+
+        Een ontbrekende grens (None) laat het bereik aan die kant open; rijen zonder
+        betaaldatum vallen er altijd buiten.
+        """
+        low, high = 0, len(self.date_values)
+        if start_date:
+            start = np.datetime64(pd.Timestamp(start_date), 'us')
+            low = np.searchsorted(self.date_values, start, side='left')
+        if end_date:
+            end = np.datetime64(pd.Timestamp(end_date) + pd.Timedelta(days=1), 'us')
+            high = np.searchsorted(self.date_values, end, side='left')
+        return self.rows_to_bitmap(self.date_order[low:high])
+
+    def quantity_slice(self, min_quantity=1, max_quantity=None):
+        """Positiebereik in quantity_order voor aantallen tussen min en max."""
+        low = np.searchsorted(self.quantity_values, min_quantity, side='left')
+        if max_quantity is None:
+            high = len(self.quantity_values)
+        else:
+            high = np.searchsorted(self.quantity_values, max_quantity, side='right')
+        return self.quantity_offsets[low], self.quantity_offsets[max(low, high)]
+
+    def quantity_bitmap(self, min_quantity=1, max_quantity=None):
+        """Bitmap van rijen met een aantal tussen min en max."""
+        start, stop = self.quantity_slice(min_quantity, max_quantity)
+        return self.rows_to_bitmap(self.quantity_order[start:stop])
+
+    def quantity_count(self, min_quantity=1, max_quantity=None):
+        """Aantal rijen binnen het aantalbereik, direct uit het histogram."""
+        start, stop = self.quantity_slice(min_quantity, max_quantity)
+        return int(stop - start)
+
+    def incidence_matrix(self, bitmap=None):
+        """Klant × product matrix: True als de klant het product besteld heeft binnen bitmap.
+
+        Zonder bitmap (of als alle rijen geselecteerd zijn) wordt de gecachte matrix over
+        alle orders gebruikt.
+        """
+        if bitmap is not None and bitmap.all():
+            bitmap = None
+        if bitmap is None and self._incidence is not None:
+            return self._incidence
+
+        valid = (self.customer_codes >= 0) & (self.product_codes >= 0)
+        if bitmap is not None:
+            valid &= bitmap
+        incidence = np.zeros((self.customer_count, len(self.products)), dtype=bool)
+        incidence[self.customer_codes[valid], self.product_codes[valid]] = True
+
+        if bitmap is None:
+            self._incidence = incidence
+        return incidence
+
+    def customers_with_all_products(self, products, bitmap=None):
+        """Bitmap van rijen waarvan de klant binnen bitmap alle opgegeven producten heeft."""
+        product_codes = [self.product_code_of.get(product) for product in set(products)]
+        if any(code is None for code in product_codes):
+            # Een product dat niet voorkomt kan door geen enkele klant besteld zijn
+            return np.zeros(self.row_count, dtype=bool)
+
+        # Eén gevectoriseerde reductie over de geselecteerde productkolommen
+        qualified = self.incidence_matrix(bitmap)[:, product_codes].all(axis=1)
+        return (self.customer_codes >= 0) & qualified[self.customer_codes]
+
+    def available_products(self, bitmap):
+        """Producten met minstens één rij in de bitmap, in volgorde van eerste voorkomen."""
+        codes = self.product_codes[bitmap]
+        present = np.bincount(codes[codes >= 0], minlength=len(self.products)) > 0
+        return [product for product, is_present in zip(self.products, present) if is_present]
+
+class NameIndex:
+    """Zoekindex over de unieke namen van een upload, voor het naamfilter.
+
+    Namen worden genormaliseerd (zie normalize_key_value) en gesorteerd, zodat een prefix
+    met bisect gevonden wordt. Daarnaast is er een gesorteerde lijst van losse woorden
+    (zoeken op achternaam) en een trigram index voor zoeken midden in een naam; die
+    laatste wordt pas bij de eerste zoekopdracht die hem nodig heeft opgebouwd.
+    """
+
+    def __init__(self, names):
+        unique = [name for name in pd.unique(names) if isinstance(name, str) and name and name != 'nan']
+        keyed = sorted((normalize_key_value(name), name) for name in unique)
+        self.keys = [key for key, _ in keyed]
+        self.names = [name for _, name in keyed]
+
+        # (woord, naam id) voor prefix zoeken op elk woord van de naam
+        words = sorted((word, name_id) for name_id, key in enumerate(self.keys) for word in key.split(' ')[1:])
+        self._words = [word for word, _ in words]
+        self._word_ids = [name_id for _, name_id in words]
+        self._trigrams = None
+
+    def __len__(self):
+        return len(self.names)
+
+    def _trigram_index(self):
+        if self._trigrams is None:
+            trigrams = {}
+            for name_id, key in enumerate(self.keys):
+                for trigram in {key[i:i + 3] for i in range(len(key) - 2)}:
+                    trigrams.setdefault(trigram, []).append(name_id)
+            self._trigrams = trigrams
+        return self._trigrams
+
+    def first(self, limit=NAME_SEARCH_LIMIT):
+        """De eerste namen in alfabetische volgorde."""
+        return self.names[:limit]
+
+    def search(self, query, limit=NAME_SEARCH_LIMIT):
+        """Maximaal limit namen: eerst die met query als begin, dan op een woord, dan ergens in de naam."""
+        query = normalize_key_value(query)
+        if not query:
+            return self.first(limit)
+
+        found = []
+        seen = set()
+
+        def add(name_id):
+            if name_id not in seen:
+                seen.add(name_id)
+                found.append(name_id)
+            return len(found) >= limit
+
+        # Prefix van de volledige naam
+        position = bisect.bisect_left(self.keys, query)
+        while position < len(self.keys) and self.keys[position].startswith(query):
+            if add(position):
+                return [self.names[name_id] for name_id in found]
+            position += 1
+
+        # Prefix van een volgend woord (bijv. de achternaam)
+        position = bisect.bisect_left(self._words, query)
+        while position < len(self._words) and self._words[position].startswith(query):
+            if add(self._word_ids[position]):
+                return [self.names[name_id] for name_id in found]
+            position += 1
+
+        # Ergens in de naam: kandidaten uit de kleinste trigram lijst, daarna controleren
+        if len(query) >= 3:
+            trigrams = self._trigram_index()
+            postings = [trigrams.get(query[i:i + 3], []) for i in range(len(query) - 2)]
+            for name_id in min(postings, key=len):
+                if name_id not in seen and query in self.keys[name_id] and add(name_id):
+                    break
+
+        return [self.names[name_id] for name_id in found]
+
+class OrderFrame:
+    """Orders van één upload, eenmalig genormaliseerd naar getypeerde kolommen.
+
+    Naast de originele CSV kolommen bevat `df` de geparste betaaldatum, het opgeschoonde
+    aantal, de volledige naam, de labelregels en de adressleutel. Filters leveren
+    boolean masks op (via de OrderIndex); alleen `view` maakt een (gefilterde) DataFrame.
+    """
+
+    def __init__(self, df, content_hash=None):
+        self.df = df
+        self.content_hash = content_hash
+        self.index = None
+        self.memory_report = None
+        self.merge_report = None
+        self._name_index = None
+        self._sort_positions = {}
+
+    def sorted_positions(self, column, descending=False):
+        """Rijposities gesorteerd op een kolom (stabiel, lege waarden achteraan); per kolom gecachet."""
+        key = (column, descending)
+        if key not in self._sort_positions:
+            values = self.df[column].reset_index(drop=True)
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                # Op de waarden sorteren, niet op de volgorde van de categorieën
+                values = values.astype(values.cat.categories.dtype)
+            text_key = (lambda series: series.str.lower()) if pd.api.types.is_string_dtype(values) else None
+            ordered = values.sort_values(ascending=not descending, kind='stable', na_position='last', key=text_key)
+            self._sort_positions[key] = ordered.index.to_numpy()
+        return self._sort_positions[key]
+
+    @property
+    def name_index(self):
+        """NameIndex over full_name, één keer per upload opgebouwd."""
+        if self._name_index is None:
+            self._name_index = NameIndex(self.df['full_name'])
+        return self._name_index
+
+    @classmethod
+    @instrumented_stage('normalize', rows_arg=1)
+    def from_dataframe(cls, raw, content_hash=None):
+        """Normaliseer een ingelezen CSV naar een OrderFrame."""
+        df = raw.copy(deep=False)
+
+        # Ontbrekende CSV kolommen als lege kolommen toevoegen
+        for column in ORDER_COLUMNS:
+            if column not in df.columns:
+                df[column] = pd.Series(np.nan, index=df.index, dtype=object)
+
+        # Geparste betaaldatum
+        df[PAID_AT_PARSED] = parse_paid_at(df['paid_at'])
+
+        # Opgeschoond aantal: alleen gehele cijferreeksen, anders 1
+        df['quantity_clean'] = map_unique_values(df['quantity'], parse_quantity_clean_value, na_value=1).astype('int64')
+
+        # Volledige naam voor het naamfilter
+        firstname = df['firstname'].astype(str).fillna('nan').str.strip()
+        lastname = df['lastname'].astype(str).fillna('nan').str.strip()
+        df['full_name'] = (firstname + ' ' + lastname).str.strip()
+
+        # Labelregels en adressleutel voor de verzendlabels
+        name, address, postal = build_label_columns(df)
+        df[LABEL_NAME] = name
+        df[LABEL_ADDRESS] = address
+        df[LABEL_POSTAL] = postal
+        df[ADDRESS_KEY] = name + '|' + address + '|' + postal
+
+        # Compacte kolomtypes; het geheugengebruik ervoor en erna wordt bewaard
+        memory_before = int(df.memory_usage(deep=True).sum())
+        df = compact_dtypes(df)
+        memory_after = int(df.memory_usage(deep=True).sum())
+
+        orders = cls(df, content_hash=content_hash)
+        orders.index = OrderIndex(df)
+        orders.memory_report = {'before': memory_before, 'after': memory_after}
+        return orders
+
+    def __len__(self):
+        return len(self.df)
+
+    def memory_usage(self):
+        """Geheugengebruik van de genormaliseerde data en de indexen in bytes."""
+        return int(self.df.memory_usage(deep=True).sum()) + self.index.memory_usage()
+
+    def all_rows(self):
+        """Mask waarin alle rijen geselecteerd zijn."""
+        return np.ones(len(self.df), dtype=bool)
+
+    def quantity_mask(self, min_quantity=1, max_quantity=None):
+        """Mask voor het aantal filter op quantity_clean."""
+        return self.index.quantity_bitmap(min_quantity, max_quantity)
+
+    def date_mask(self, start_date, end_date):
+        """Mask voor betaaldatums tussen start_date en end_date (beide inclusief, op dag; None is open)."""
+        return self.index.date_bitmap(start_date, end_date)
+
+    def product_mask(self, products):
+        """Mask voor rijen waarvan het product in products voorkomt."""
+        return self.index.product_bitmap(products)
+
+    def view(self, mask=None, columns=None):
+        """Gefilterde DataFrame voor weergave of export."""
+        df = self.df if columns is None else self.df[columns]
+        if mask is None:
+            return df
+        return df[mask]
+
+@instrumented_stage('filter')
+def filter_orders(orders, selected_products, start_date, end_date, min_quantity, max_quantity, selected_names, product_logic):
+    """Bepaal welke orders door de overzichtsfilters komen; geeft een boolean mask terug."""
+    df = orders.df
+    mask = orders.all_rows()
+
+    # Datum filter; met één grens is het bereik aan de andere kant open, zoals bij de labels
+    if start_date or end_date:
+        mask = mask & orders.date_mask(start_date, end_date)
 
     # Naam filter
     if selected_names:
-        df_filtered = df_filtered[df_filtered['full_name'].isin(selected_names)]
+        mask = mask & df['full_name'].isin(selected_names).to_numpy()
 
     # Product filter met AND/OR logica
     if selected_products:
+        product_mask = orders.product_mask(selected_products)
         if product_logic == "OR":
             # OR logica: minstens één geselecteerd product
-            df_filtered = df_filtered[df_filtered['product'].isin(selected_products)]
+            mask = mask & product_mask
         else:
             # AND logica: alle geselecteerde producten moeten aanwezig zijn
-            # Groepeer per klant (email) en controleer of alle geselecteerde producten aanwezig zijn
-            customer_products = df_filtered.groupby('email')['product'].apply(set).reset_index()
+            # Klanten (email) met alle producten binnen de huidige selectie, via de incidentiematrix
+            qualified = orders.index.customers_with_all_products(selected_products, mask)
+            mask = mask & qualified & product_mask
+
+    # Aantal filter
+    mask = mask & orders.quantity_mask(min_quantity, max_quantity)
+
+    return mask
+
+class IngestCache:
+    """LRU cache van ingelezen uploads, gesleuteld op een hash van de bestandsinhoud.
+
+    Begrensd op aantal entries en op totaal geheugengebruik; houdt hits en misses bij.
+    """
+
+    def __init__(self, max_entries=INGEST_CACHE_MAX_ENTRIES, max_bytes=INGEST_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Geef de gecachte waarde terug (en markeer als recent gebruikt), of None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, size):
+        """Sla een waarde op en verwijder de oudste entries tot de limieten weer kloppen."""
+        with self._lock:
+            if key in self._entries:
+                self._total_bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self._total_bytes += size
+            # De nieuwste entry blijft altijd staan, ook als die alleen al te groot is
+            while len(self._entries) > 1 and (len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes):
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._total_bytes -= evicted_size
+                self.evictions += 1
+
+    def stats(self):
+        """Tellers en grootte van de cache."""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._total_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+@st.cache_resource
+def get_ingest_cache():
+    """Eén gedeelde ingestie cache per server."""
+    return IngestCache()
+
+def hash_upload(uploaded_file):
+    """Hash van de bestandsinhoud, per upload één keer berekend."""
+    upload_hashes = st.session_state.setdefault('upload_hashes', {})
+    file_id = getattr(uploaded_file, 'file_id', None)
+    if file_id is not None and file_id in upload_hashes:
+        return upload_hashes[file_id]
+
+    content_hash = hashlib.blake2b(uploaded_file.getvalue(), digest_size=16).hexdigest()
+    if file_id is not None:
+        upload_hashes[file_id] = content_hash
+    return content_hash
+
+def load_orders(uploaded_files):
+    """Lees en normaliseer een of meer uploads via de ingestie cache; geeft een OrderFrame of None terug.
+
+    Meerdere bestanden worden tegelijk ingelezen en samengevoegd (zie merge_order_files);
+    de cache sleutel dekt de inhoud van alle bestanden, in uploadvolgorde.
+    """
+    content_hashes = [hash_upload(uploaded_file) for uploaded_file in uploaded_files]
+    if len(content_hashes) == 1:
+        content_hash = content_hashes[0]
+    else:
+        content_hash = hashlib.blake2b('|'.join(content_hashes).encode('utf-8'), digest_size=16).hexdigest()
+    cache = get_ingest_cache()
+
+    orders = cache.get(content_hash)
+    if orders is None:
+        if len(uploaded_files) == 1:
+            with st.spinner("CSV-bestand wordt gelezen..."):
+                df = read_csv_data(BytesIO(uploaded_files[0].getvalue()))
+                if df is None:
+                    return None
+                orders = OrderFrame.from_dataframe(df, content_hash=content_hash)
+        else:
+            with st.spinner(f"{len(uploaded_files)} CSV-bestanden worden gelezen..."):
+                results = read_order_files([(uploaded_file.name, uploaded_file.getvalue()) for uploaded_file in uploaded_files])
+                for name, _, error in results:
+                    if error is not None:
+                        st.error(f"Fout bij het lezen van {name}: {error}")
+                if any(error is not None for _, _, error in results):
+                    return None
+                df, merge_report = merge_order_files([(name, frame) for name, frame, _ in results])
+                orders = OrderFrame.from_dataframe(df, content_hash=content_hash)
+                orders.merge_report = merge_report
+        cache.put(content_hash, orders, orders.memory_usage())
+
+    return orders
 
-            # Vind klanten die alle geselecteerde producten hebben
-            qualified_customers = []
-            selected_products_set = set(selected_products)
-            for _, row in customer_products.iterrows():
-                if selected_products_set.issubset(row['product']):
-                    qualified_customers.append(row['email'])
+# ------------------------------
+# ORDER OPSLAG
+# ------------------------------
 
-            # Filter op gekwalificeerde klanten
-            df_filtered = df_filtered[df_filtered['email'].isin(qualified_customers) &
-                                     df_filtered['product'].isin(selected_products)]
+def order_hash_text(value):
+    """Tekstvorm van een CSV waarde voor de order hash.
 
-    # Aantal filter
-    df_filtered['quantity_clean'] = df_filtered['quantity'].apply(lambda x: int(x) if pd.notna(x) and str(x).isdigit() else 1)
-    df_filtered = df_filtered[df_filtered['quantity_clean'] >= min_quantity]
-    if max_quantity is not None:
-        df_filtered = df_filtered[df_filtered['quantity_clean'] <= max_quantity]
+    Getallen worden genormaliseerd, zodat 12, 12.0 en '12' (en 12.5 en '12.50') dezelfde
+    tekst geven, ongeacht hoe de kolom is ingelezen.
+    """
+    text = str(value).strip()
+    try:
+        number = float(text)
+    except ValueError:
+        return text
+    if number.is_integer():
+        return str(int(number))
+    return repr(number) if np.isfinite(number) else text
+
+def compute_order_hashes(df):
+    """Stabiele hash per order over alle CSV kolommen, onafhankelijk van het ingelezen dtype."""
+    parts = []
+    for column in ORDER_COLUMNS:
+        if column in df.columns:
+            parts.append(map_unique_values(df[column], order_hash_text).to_numpy())
+        else:
+            parts.append(np.full(len(df), '', dtype=object))
+    return pd.Series(
+        [hashlib.blake2b('\x1f'.join(values).encode('utf-8'), digest_size=16).hexdigest() for values in zip(*parts)],
+        index=df.index,
+        dtype=object
+    )
+
+class OrderStore:
+    """Persistente orderopslag in SQLite, zodat een nieuwe export alleen de nieuwe orders oplevert.
+
+    Orders worden herkend aan hun order hash en blijven bewaard met het tijdstip waarop ze
+    voor het eerst gezien en (eventueel) geprint zijn. Er zijn indexen op betaaldatum,
+    product en op de nog niet geprinte orders.
+    """
+
+    def __init__(self, path=ORDER_STORE_PATH):
+        self.path = path
+        with self._connect() as conn:
+            columns = ', '.join(f'"{column}"' for column in ORDER_COLUMNS)
+            conn.executescript(f"""
+                CREATE TABLE IF NOT EXISTS orders (
+                    order_hash TEXT PRIMARY KEY,
+                    {columns},
+                    paid_at_iso TEXT,
+                    product_key TEXT,
+                    first_seen TEXT NOT NULL,
+                    printed_at TEXT
+                );
+                CREATE INDEX IF NOT EXISTS idx_orders_paid_at ON orders(paid_at_iso);
+                CREATE INDEX IF NOT EXISTS idx_orders_product ON orders(product_key, paid_at_iso);
+                CREATE INDEX IF NOT EXISTS idx_orders_unprinted ON orders(paid_at_iso) WHERE printed_at IS NULL;
+            """)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        return conn
+
+    def revision(self):
+        """Teller die bij elke wijziging ophoogt; bruikbaar als cachesleutel."""
+        with self._connect() as conn:
+            return conn.execute('PRAGMA user_version').fetchone()[0]
+
+    def _bump_revision(self, conn):
+        revision = conn.execute('PRAGMA user_version').fetchone()[0]
+        conn.execute(f'PRAGMA user_version = {revision + 1}')
+
+    @instrumented_stage('store_ingest', rows_arg=1)
+    def ingest(self, df):
+        """Voeg de orders uit een ingelezen CSV toe; bekende orders worden overgeslagen.
+
+        Geeft een dict met het aantal nieuwe en al bekende orders terug.
+        """
+        hashes = compute_order_hashes(df)
+        if PAID_AT_PARSED in df.columns:
+            paid_at = df[PAID_AT_PARSED]
+        else:
+            paid_at = parse_paid_at(df['paid_at']) if 'paid_at' in df.columns else pd.Series(pd.NaT, index=df.index)
+        paid_at_iso = paid_at.dt.strftime('%Y-%m-%d %H:%M:%S').astype(object)
+
+        columns = []
+        for column in ORDER_COLUMNS:
+            if column in df.columns:
+                values = df[column].astype(object)
+                columns.append(values.where(values.notna(), None).tolist())
+            else:
+                columns.append([None] * len(df))
+        product_key = map_unique_values(df['product'], lambda value: str(value).strip(), na_value=None).tolist() \
+            if 'product' in df.columns else [None] * len(df)
+
+        first_seen = datetime.now().isoformat(timespec='seconds')
+        rows = (
+            (order_hash, *values, iso if isinstance(iso, str) else None, key, first_seen)
+            for order_hash, iso, key, *values in zip(hashes, paid_at_iso, product_key, *columns)
+        )
+        placeholders = ', '.join(['?'] * (len(ORDER_COLUMNS) + 4))
+        column_names = ', '.join(f'"{column}"' for column in ORDER_COLUMNS)
+
+        with self._connect() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                f'INSERT OR IGNORE INTO orders (order_hash, {column_names}, paid_at_iso, product_key, first_seen) '
+                f'VALUES ({placeholders})',
+                rows
+            )
+            new_orders = conn.total_changes - before
+            if new_orders:
+                self._bump_revision(conn)
+
+        return {'new': new_orders, 'known': int(hashes.nunique()) - new_orders}
+
+    @instrumented_stage('store_unprinted')
+    def unprinted(self, products=None, start_date=None, end_date=None):
+        """Nog niet geprinte orders als DataFrame met de CSV kolommen en de order hash."""
+        column_names = ', '.join(f'"{column}"' for column in ORDER_COLUMNS)
+        query = f'SELECT order_hash, {column_names} FROM orders WHERE printed_at IS NULL'
+        params = []
+        if products:
+            query += f' AND product_key IN ({", ".join(["?"] * len(products))})'
+            params.extend(str(product).strip() for product in products)
+        if start_date:
+            query += ' AND paid_at_iso >= ?'
+            params.append(pd.Timestamp(start_date).strftime('%Y-%m-%d %H:%M:%S'))
+        if end_date:
+            query += ' AND paid_at_iso <= ?'
+            params.append(pd.Timestamp(end_date).strftime('%Y-%m-%d %H:%M:%S'))
+        query += ' ORDER BY rowid'
+
+        with self._connect() as conn:
+            return pd.read_sql_query(query, conn, params=params)
+
+    def mark_printed(self, order_hashes):
+        """Markeer orders als geprint; geeft het aantal gemarkeerde orders terug."""
+        printed_at = datetime.now().isoformat(timespec='seconds')
+        with self._connect() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                'UPDATE orders SET printed_at = ? WHERE order_hash = ? AND printed_at IS NULL',
+                ((printed_at, order_hash) for order_hash in order_hashes)
+            )
+            marked = conn.total_changes - before
+            if marked:
+                self._bump_revision(conn)
+        return marked
+
+    def stats(self):
+        """Aantal opgeslagen, geprinte en nog niet geprinte orders."""
+        with self._connect() as conn:
+            total, printed = conn.execute('SELECT COUNT(*), COUNT(printed_at) FROM orders').fetchone()
+        return {'total': total, 'printed': printed, 'unprinted': total - printed}
+
+@st.cache_resource
+def get_order_store():
+    """Eén orderopslag per server."""
+    return OrderStore()
+
+def load_unprinted_orders(store, upload_name, orders):
+    """Neem een upload op in de orderopslag en geef de nog niet geprinte orders als OrderFrame terug."""
+    ingested = st.session_state.setdefault('store_ingested', {})
+    if orders.content_hash not in ingested:
+        with st.spinner("Orders worden opgeslagen..."):
+            ingested[orders.content_hash] = store.ingest(orders.df)
+    result = ingested[orders.content_hash]
+    st.caption(f"Orderopslag: {result['new']} nieuwe en {result['known']} al bekende orders in {upload_name}")
+
+    # Gecachet per stand van de opslag; na markeren als geprint wordt opnieuw gelezen
+    cache_key = f"store:{os.path.abspath(store.path)}:{store.revision()}"
+    cache = get_ingest_cache()
+    unprinted = cache.get(cache_key)
+    if unprinted is None:
+        unprinted = OrderFrame.from_dataframe(store.unprinted(), content_hash=cache_key)
+        cache.put(cache_key, unprinted, unprinted.memory_usage())
+    return unprinted
+
+# ------------------------------
+# MEERDERE UPLOADS
+# ------------------------------
+
+def read_order_file(data):
+    """Lees één CSV (pad, buffer of bytes); geeft (DataFrame, None) of (None, foutmelding) terug.
+
+    Zonder Streamlit aanroepen, zodat dit in een worker thread kan draaien.
+    """
+    if isinstance(data, bytes):
+        data = BytesIO(data)
+    try:
+        return pd.read_csv(data), None
+    except Exception as e:
+        return None, str(e)
+
+@instrumented_stage('read_csv_files')
+def read_order_files(files, workers=UPLOAD_READ_WORKERS):
+    """Lees meerdere CSV bestanden tegelijk in een thread pool.
+
+    files is een lijst (naam, pad/buffer/bytes). Geeft per bestand (naam, DataFrame of None,
+    foutmelding of None) terug, in dezelfde volgorde. De CSV parser van pandas geeft de GIL
+    vrij, dus threads lezen echt parallel zonder de frames tussen processen te kopiëren.
+    """
+    if len(files) <= 1 or workers <= 1:
+        results = [read_order_file(data) for _, data in files]
+    else:
+        with ThreadPoolExecutor(max_workers=min(workers, len(files))) as executor:
+            results = list(executor.map(read_order_file, [data for _, data in files]))
+    return [(name, df, error) for (name, _), (df, error) in zip(files, results)]
+
+def align_order_columns(df):
+    """Breng een ingelezen CSV op het verwachte schema: kolomnamen zonder spaties en hoofdletters
+    als ze zo een ORDER_COLUMNS kolom zijn, en ontbrekende ORDER_COLUMNS als lege kolommen."""
+    renames = {}
+    for column in df.columns:
+        normalized = str(column).strip().lower()
+        if normalized != column and normalized in ORDER_COLUMNS and normalized not in df.columns:
+            renames[column] = normalized
+    df = df.rename(columns=renames)
+    for column in ORDER_COLUMNS:
+        if column not in df.columns:
+            df[column] = pd.Series(np.nan, index=df.index, dtype=object)
+    return df
+
+@instrumented_stage('merge_files')
+def merge_order_files(frames):
+    """Voeg ingelezen CSV bestanden samen tot één DataFrame.
+
+    frames is een lijst (naam, DataFrame) in uploadvolgorde. Kolommen worden uitgelijnd
+    (align_order_columns); een kolom die per bestand een ander type heeft (bijv. postcodes
+    als getal en als tekst) wordt overal tekst via order_hash_text. Orders die al in een
+    eerder bestand staan (zelfde order hash) vallen weg; dubbele regels binnen één bestand
+    blijven staan, net als bij een enkele upload.
+
+    Geeft de DataFrame en per bestand een dict met naam, rijen en weggevallen dubbelen terug.
+    """
+    names = [name for name, _ in frames]
+    frames = [align_order_columns(df) for _, df in frames]
+
+    for column in ORDER_COLUMNS:
+        dtypes = [df[column].dtype for df in frames if df[column].notna().any()]
+        if all(pd.api.types.is_numeric_dtype(dtype) for dtype in dtypes):
+            continue
+        if len({str(dtype) for dtype in dtypes}) > 1:
+            for df in frames:
+                if pd.api.types.is_numeric_dtype(df[column]):
+                    df[column] = map_unique_values(df[column], order_hash_text, na_value=np.nan)
+
+    combined = pd.concat(frames, ignore_index=True)
+    source = np.repeat(np.arange(len(frames)), [len(df) for df in frames])
+
+    # Alleen het eerste bestand waarin een order voorkomt telt
+    hashes = compute_order_hashes(combined)
+    first_source = pd.Series(source).groupby(hashes.to_numpy()).transform('min').to_numpy()
+    keep = source == first_source
+    combined = combined[keep].reset_index(drop=True)
+
+    report = [
+        {'name': name, 'rows': len(df), 'duplicates': int((~keep[source == position]).sum())}
+        for position, (name, df) in enumerate(zip(names, frames))
+    ]
+    return combined, report
+
+# ------------------------------
+# EXPORT CACHE
+# ------------------------------
+
+def artifact_cache_key(kind, content_hash, products, start_date, end_date, min_quantity, max_quantity, sort_order, product_logic, **extra):
+    """Sleutel van een export: cacheversie, soort, upload hash en alle filters die de inhoud bepalen."""
+    params = {
+        'version': ARTIFACT_CACHE_VERSION,
+        'kind': kind,
+        'content_hash': content_hash,
+        'products': sorted(str(product) for product in products or ()),
+        'start_date': str(start_date) if start_date else None,
+        'end_date': str(end_date) if end_date else None,
+        'min_quantity': min_quantity,
+        'max_quantity': max_quantity,
+        'sort_order': sort_order,
+        'product_logic': product_logic,
+        'extra': {name: value for name, value in sorted(extra.items())},
+    }
+    encoded = json.dumps(params, sort_keys=True, default=str).encode('utf-8')
+    return f"{kind}-{hashlib.blake2b(encoded, digest_size=16).hexdigest()}"
+
+class ArtifactCache:
+    """LRU cache van gegenereerde exports op schijf, begrensd op aantal bestanden en totale grootte.
+
+    Elk artefact is een bestand met daarnaast een JSON bestand met metadata. De
+    wijzigingstijd van het bestand geldt als laatst gebruikt, zodat de LRU volgorde een
+    herstart van de server overleeft. Houdt hits, misses en verwijderingen bij.
+    """
+
+    def __init__(self, directory=ARTIFACT_CACHE_DIR, max_entries=ARTIFACT_CACHE_MAX_ENTRIES, max_bytes=ARTIFACT_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.evicted_bytes = 0
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self._build_rates = {}
+        self._lock = threading.Lock()
+
+        # Bestaande artefacten inlezen, oudste eerst
+        os.makedirs(directory, exist_ok=True)
+        found = []
+        for filename in os.listdir(directory):
+            if filename.endswith('.bin'):
+                path = os.path.join(directory, filename)
+                stat = os.stat(path)
+                found.append((stat.st_mtime, filename[:-len('.bin')], stat.st_size))
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self._total_bytes += size
+        with self._lock:
+            self._evict()
+
+    def _paths(self, key):
+        base = os.path.join(self.directory, key)
+        return base + '.bin', base + '.json'
+
+    def get(self, key):
+        """Geef (data, metadata) terug en markeer als recent gebruikt, of None."""
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            data_path, meta_path = self._paths(key)
+            try:
+                with open(data_path, 'rb') as f:
+                    data = f.read()
+                with open(meta_path, 'r', encoding='utf-8') as f:
+                    meta = json.load(f)
+                os.utime(data_path)
+            except (OSError, ValueError):
+                # Bestand is buiten de cache om verdwenen of beschadigd
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return data, meta
+
+    def put(self, key, data, meta=None):
+        """Sla een artefact (bytes of een leesbare buffer) atomair op en verwijder de oudste tot de limieten weer kloppen."""
+        data_path, meta_path = self._paths(key)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            for path, content, mode in ((meta_path, json.dumps(meta or {}, default=str), 'w'), (data_path, data, 'wb')):
+                tmp_path = f"{path}.{threading.get_ident()}.tmp"
+                with open(tmp_path, mode) as f:
+                    if hasattr(content, 'read'):
+                        content.seek(0)
+                        shutil.copyfileobj(content, f)
+                    else:
+                        f.write(content)
+                os.replace(tmp_path, path)
+            size = os.path.getsize(data_path)
+            self._entries[key] = size
+            self._total_bytes += size
+            self._evict()
+
+    def _remove(self, key):
+        self._total_bytes -= self._entries.pop(key)
+        for path in self._paths(key):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _evict(self):
+        # Het nieuwste artefact blijft altijd staan, ook als dat alleen al te groot is
+        while len(self._entries) > 1 and (len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes):
+            key = next(iter(self._entries))
+            self.evicted_bytes += self._entries[key]
+            self._remove(key)
+            self.evictions += 1
+
+    def stats(self):
+        """Tellers en grootte van de cache."""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._total_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'evicted_bytes': self.evicted_bytes,
+            }
+
+    def record_build(self, kind, rows, seconds):
+        """Onthoud de gemeten bouwtijd per rij van een soort export, voor schattingen."""
+        if rows:
+            with self._lock:
+                self._build_rates[kind] = seconds / rows
+
+    def estimate_build(self, kind, rows):
+        """Geschatte bouwtijd in seconden voor een export van rows rijen, of None als nog niet gemeten."""
+        with self._lock:
+            rate = self._build_rates.get(kind)
+        return None if rate is None else rate * rows
+
+@st.cache_resource
+def get_artifact_cache():
+    """Eén gedeelde export cache per server."""
+    return ArtifactCache()
+
+def lazy_export(cache, kind, key, build, rows):
+    """Functie zonder argumenten voor st.download_button die de export pas bij een download maakt.
+
+    Bestaat de export al in de cache (zelfde bestand en filters) dan wordt die gebruikt;
+    anders wordt hij gebouwd, opgeslagen en de bouwtijd onthouden voor de diagnostiek.
+    """
+    def payload():
+        cached = cache.get(key)
+        if cached is not None:
+            return cached[0]
+        start = time.perf_counter()
+        data = build()
+        seconds = time.perf_counter() - start
+        cache.put(key, data, {'orders': rows, 'build_seconds': round(seconds, 4)})
+        cache.record_build(kind, rows, seconds)
+        return data
+    return payload
+
+# ------------------------------
+# ACHTERGRONDTAKEN
+# ------------------------------
+
+class BackgroundJob:
+    """Een label- of Excel taak die in een achtergrondthread draait.
+
+    De taak bewaart zijn status, voortgang en resultaat zelf, zodat de Streamlit sessie
+    hem in session_state kan bewaren en na een rerun gewoon weer kan tonen.
+    """
+
+    QUEUED = 'wachtrij'
+    RUNNING = 'bezig'
+    DONE = 'klaar'
+    CANCELLED = 'geannuleerd'
+    FAILED = 'mislukt'
+
+    def __init__(self, kind, params_key=None):
+        self.kind = kind
+        self.params_key = params_key
+        self.status = self.QUEUED
+        self.steps_done = 0
+        self.steps_total = 0
+        self.result = None
+        self.info = {}
+        self.stages = []
+        self.error = None
+        self.cancel_event = threading.Event()
+        self.future = None
+        self._result_lock = threading.Lock()
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def done(self):
+        return self.status in (self.DONE, self.CANCELLED, self.FAILED)
+
+    def set_progress(self, steps_done, steps_total):
+        self.steps_done = steps_done
+        self.steps_total = steps_total
+
+    def progress_fraction(self):
+        return self.steps_done / self.steps_total if self.steps_total else 0.0
+
+    def cancel(self):
+        """Vraag annulering aan; een taak in de wachtrij wordt direct geannuleerd."""
+        self.cancel_event.set()
+        if self.future is not None and self.future.cancel():
+            self.status = self.CANCELLED
+            self.finished_at = time.time()
+
+    def result_bytes(self):
+        """Het resultaat als bytes, ook als de taak een buffer (bijvoorbeeld pdf_buffer) opleverde.
+
+        Bedoeld als uitgestelde data voor st.download_button: pas bij de klik wordt de
+        buffer één keer gelezen. Streamen kan niet; de media manager van Streamlit
+        bewaart elke download als bytes in het geheugen en leest ook een bestandsobject
+        helemaal in. Bytes doorgeven maakt daarom geen extra kopie.
+        """
+        if not hasattr(self.result, 'read'):
+            return self.result
+        # Eén lezer tegelijk, anders lopen seek en read van gelijktijdige downloads door elkaar
+        with self._result_lock:
+            self.result.seek(0)
+            return self.result.read()
+
+class JobRunner:
+    """Gedeelde thread pool voor achtergrondtaken; begrenst het aantal gelijktijdige taken per server."""
+
+    def __init__(self, max_workers=JOB_MAX_CONCURRENT):
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='labels-job')
+        self._jobs = set()
+        self._lock = threading.Lock()
+
+    def submit(self, job, func, *args, **kwargs):
+        """Start func(job, *args, **kwargs) zodra er een plek vrij is; het resultaat komt in job.result."""
+        def run():
+            if job.cancel_event.is_set():
+                job.status = BackgroundJob.CANCELLED
+                return
+            job.status = BackgroundJob.RUNNING
+            job.started_at = time.time()
+            try:
+                job.result = func(job, *args, **kwargs)
+                job.status = BackgroundJob.DONE
+            except JobCancelled:
+                job.status = BackgroundJob.CANCELLED
+            except Exception as e:
+                STAGE_LOGGER.exception("Achtergrondtaak %s mislukt", job.kind)
+                job.error = str(e)
+                job.status = BackgroundJob.FAILED
+            finally:
+                job.finished_at = time.time()
+
+        def forget(_future):
+            # Ook voor taken die in de wachtrij geannuleerd zijn
+            with self._lock:
+                self._jobs.discard(job)
+
+        with self._lock:
+            self._jobs.add(job)
+        job.future = self._executor.submit(run)
+        job.future.add_done_callback(forget)
+        return job
+
+    def stats(self):
+        """Aantal lopende en wachtende taken op de server."""
+        with self._lock:
+            running = sum(1 for job in self._jobs if job.status == BackgroundJob.RUNNING)
+            return {'running': running, 'queued': len(self._jobs) - running, 'max_workers': self.max_workers}
+
+@st.cache_resource
+def get_job_runner():
+    """Eén gedeelde job runner per server."""
+    return JobRunner()
+
+def run_label_job(job, df, allowed_products, sort_order, start_date, end_date, min_quantity, max_quantity, dedup, template):
+    """Achtergrondtaak: labels genereren en als PDF renderen; geeft de PDF bytes terug (None zonder labels).
+
+    Orders uit de orderopslag (met ORDER_HASH kolom) krijgen de hashes van de orders op de
+    labels mee in job.info, zodat precies die als geprint gemarkeerd kunnen worden.
+    """
+    merge_report = []
+    selected_orders = [] if ORDER_HASH in df.columns else None
+    labels = generate_shipping_labels(
+        df=df,
+        allowed_products=allowed_products,
+        sort_order=sort_order,
+        start_date=start_date,
+        end_date=end_date,
+        min_quantity=min_quantity,
+        max_quantity=max_quantity,
+        dedup=dedup,
+        merge_report=merge_report,
+        selected_orders=selected_orders
+    )
+    label_template = get_label_template(template)
+    job.info = {
+        'labels': len(labels),
+        'merged': merge_report,
+        'order_hashes': selected_orders,
+        'pages': (len(labels) + label_template.labels_per_page - 1) // label_template.labels_per_page,
+        'layout': f"{label_template.rows}×{label_template.cols}",
+    }
+    check_cancelled(job.cancel_event)
+    if not labels:
+        return None
+
+    # Rechtstreeks in een buffer renderen: grote PDF's staan op schijf in plaats van in het geheugen
+    buffer = pdf_buffer()
+    create_pdf_from_labels(labels, buffer, mode='parallel', workers=APP_PDF_WORKERS, template=template,
+                           progress=job.set_progress, cancel_event=job.cancel_event,
+                           start_method=APP_PDF_START_METHOD)
+    return buffer
+
+def run_excel_job(job, df_filtered):
+    """Achtergrondtaak: Excel export in verzendformaat; geeft de Excel bytes terug."""
+    job.info = {'orders': len(df_filtered)}
+    return generate_excel_export(df_filtered, progress=job.set_progress, cancel_event=job.cancel_event)
+
+def start_background_job(kind, params_key, func, *args, cache_key=None):
+    """Start een taak voor deze sessie; een nog lopende taak van dezelfde soort wordt geannuleerd.
+
+    Met een cache_key wordt eerst de export cache geraadpleegd: bij een hit is de taak
+    direct klaar, anders wordt het resultaat na afloop in de cache gezet.
+    """
+    jobs = st.session_state.setdefault('background_jobs', {})
+    previous = jobs.get(kind)
+    if previous is not None and not previous.done:
+        previous.cancel()
+
+    job = BackgroundJob(kind, params_key)
+
+    # De recorder van de rerun is thread-lokaal: met de diagnostiek aan meet de taak zijn
+    # stappen met een eigen recorder en bewaart ze in job.stages
+    session_recorder = active_stage_recorder()
+
+    def run_recorded(job, *func_args):
+        if session_recorder is None:
+            return func(job, *func_args)
+        with StageRecorder(log_stages=session_recorder.log_stages) as recorder:
+            try:
+                return func(job, *func_args)
+            finally:
+                job.stages = recorder.records
+
+    if cache_key is None:
+        jobs[kind] = get_job_runner().submit(job, run_recorded, *args)
+        return
+
+    cache = get_artifact_cache()
+    cached = cache.get(cache_key)
+    if cached is not None:
+        job.result, job.info = cached
+        job.info['from_cache'] = True
+        job.status = BackgroundJob.DONE
+        job.finished_at = time.time()
+        jobs[kind] = job
+        return
+
+    def run_and_cache(job, *func_args):
+        start = time.perf_counter()
+        result = run_recorded(job, *func_args)
+        if result is not None:
+            cache.put(cache_key, result, job.info)
+            cache.record_build(kind, job.info.get('orders'), time.perf_counter() - start)
+        return result
+
+    jobs[kind] = get_job_runner().submit(job, run_and_cache, *args)
+
+def show_job_panel(kind, params_key, show_result):
+    """Toon de voortgang van de taak van deze soort, of het resultaat als hij klaar is.
+
+    Zolang de taak loopt ververst alleen dit fragment zich; als de taak klaar is volgt één
+    volledige rerun, zodat show_result(job, verouderd) het resultaat kan tonen.
+    """
+    job = st.session_state.get('background_jobs', {}).get(kind)
+    if job is None:
+        return
+
+    if job.done:
+        show_result(job, job.params_key != params_key)
+        return
+
+    @st.fragment(run_every=JOB_POLL_SECONDS)
+    def job_progress():
+        if job.done:
+            st.rerun()
+        if job.status == BackgroundJob.QUEUED:
+            runner_stats = get_job_runner().stats()
+            st.progress(0.0, text=f"In de wachtrij ({runner_stats['running']} van {runner_stats['max_workers']} taken bezig)")
+        else:
+            st.progress(job.progress_fraction(), text=f"Bezig... {job.steps_done} van {job.steps_total or '?'}")
+        if st.button("Annuleren", key=f"cancel_job_{kind}", width='stretch'):
+            job.cancel()
+
+    job_progress()
+
+# ------------------------------
+# TAB FUNCTIES
+# ------------------------------
+
+
+def format_order_table(df):
+    """Maak orders op voor weergave of CSV: geselecteerde kolommen, datum, bedrag en Nederlandse kolomnamen."""
+    # Selecteer kolommen om te tonen
+    display_columns = [
+        'paid_at', 'product', 'quantity', 'amount_with_tax',
+        'company', 'firstname', 'lastname', 'full_name', 'email', 'city',
+        'payment_method'
+    ]
+
+    # Zorg dat kolommen bestaan
+    display_columns = [col for col in display_columns if col in df.columns]
+
+    # Formatteer de data voor weergave
+    display_df = df[display_columns].copy()
+
+    # Formatteer datums
+    if 'paid_at' in display_df.columns:
+        display_df['paid_at'] = df[PAID_AT_PARSED].dt.strftime('%d-%m-%Y %H:%M')
+
+    # Formatteer bedragen
+    if 'amount_with_tax' in display_df.columns:
+        display_df['amount_with_tax'] = display_df['amount_with_tax'].apply(
+            lambda x: f"€{x:,.2f}".replace(',', '.') if pd.notna(x) else ""
+        )
+
+    # Formatteer namen
+    if 'full_name' in display_df.columns:
+        # Rename full_name to Naam for better readability
+        display_df = display_df.rename(columns={'full_name': 'Naam'})
+        # Remove individual name columns if they exist
+        if 'firstname' in display_df.columns:
+            display_df = display_df.drop(['firstname'], axis=1)
+        if 'lastname' in display_df.columns:
+            display_df = display_df.drop(['lastname'], axis=1)
+
+    # Hernoem kolommen voor betere leesbaarheid
+    column_names = {
+        'paid_at': 'Betaaldatum',
+        'product': 'Product',
+        'quantity': 'Aantal',
+        'amount_with_tax': 'Bedrag (incl. BTW)',
+        'company': 'Bedrijf',
+        'email': 'E-mail',
+        'city': 'Plaats',
+        'payment_method': 'Betaalmethode'
+    }
+    return display_df.rename(columns=column_names)
+
+def order_table_positions(orders, mask, sort_label=None, descending=False, search=''):
+    """Rijposities van de gefilterde orders in weergavevolgorde, na zoeken en sorteren."""
+    if search:
+        # Zoeken alleen binnen de gefilterde rijen, hoofdletterongevoelig
+        filtered = np.flatnonzero(mask)
+        subset = orders.df.iloc[filtered]
+        found = np.zeros(len(filtered), dtype=bool)
+        for column in ORDER_TABLE_SEARCH_COLUMNS:
+            found = found | subset[column].astype(str).str.contains(search, case=False, regex=False).to_numpy()
+        mask = np.zeros(len(orders), dtype=bool)
+        mask[filtered[found]] = True
+
+    if sort_label in ORDER_TABLE_SORT_COLUMNS:
+        positions = orders.sorted_positions(ORDER_TABLE_SORT_COLUMNS[sort_label], descending)
+        return positions[mask[positions]]
+    return np.flatnonzero(mask)
+
+def show_order_table(orders, mask):
+    """Gepagineerd orderoverzicht: zoeken en sorteren op de server, opmaak alleen voor de zichtbare pagina."""
+    col_search, col_sort, col_direction, col_size = st.columns([3, 2, 1, 1])
+    with col_search:
+        search = st.text_input("Zoeken in orders:", key='order_table_search',
+                               placeholder="Naam, e-mail, bedrijf, plaats of product")
+    with col_sort:
+        sort_label = st.selectbox("Sorteer op:", ['Bestandsvolgorde'] + list(ORDER_TABLE_SORT_COLUMNS),
+                                  key='order_table_sort')
+    with col_direction:
+        descending = st.toggle("Aflopend", key='order_table_descending', disabled=sort_label not in ORDER_TABLE_SORT_COLUMNS)
+    with col_size:
+        page_size = st.selectbox("Per pagina:", ORDER_TABLE_PAGE_SIZES, index=1, key='order_table_page_size')
+
+    positions = order_table_positions(orders, mask, sort_label, descending, search.strip())
+    total_rows = len(positions)
+    total_pages = max(1, (total_rows + page_size - 1) // page_size)
+
+    # Terug naar de eerste pagina bij een andere zoekopdracht of sortering, of als er minder pagina's zijn
+    view_key = (search, sort_label, descending, page_size, total_rows)
+    if st.session_state.get('order_table_view') != view_key or st.session_state.get('order_table_page', 1) > total_pages:
+        st.session_state['order_table_page'] = 1
+    st.session_state['order_table_view'] = view_key
+    page = st.number_input(f"Pagina (van {total_pages}):", min_value=1, max_value=total_pages, step=1, key='order_table_page')
+
+    start = (page - 1) * page_size
+    page_df = format_order_table(orders.df.iloc[positions[start:start + page_size]])
+
+    st.dataframe(
+        page_df,
+        width='stretch',
+        hide_index=True,
+        column_config={
+            col: st.column_config.TextColumn(col, width="medium")
+            for col in page_df.columns
+        }
+    )
+    if total_rows:
+        st.caption(f"Rijen {start + 1}–{min(start + page_size, total_rows)} van {total_rows}")
+    else:
+        st.caption("Geen orders gevonden voor deze zoekterm")
+
+def show_label_job_result(job, stale):
+    """Toon het resultaat van een afgeronde labeltaak."""
+    if job.status == BackgroundJob.CANCELLED:
+        st.warning("Genereren van verzendlabels geannuleerd.")
+        return
+    if job.status == BackgroundJob.FAILED:
+        st.error(f"Fout bij het genereren van labels: {job.error}")
+        return
+    if job.result is None:
+        st.error("Geen geldige labels gevonden met de geselecteerde filters.")
+        return
+
+    labels_count = job.info['labels']
+    st.success(f"{labels_count} unieke verzendlabels gegenereerd!")
+    if job.info.get('from_cache'):
+        st.caption("Uit de export cache (zelfde bestand en filters).")
+    if stale:
+        st.caption("Gemaakt met eerdere filterinstellingen; klik opnieuw om bij te werken.")
+
+    # Overzicht van samengevoegde adressen bij fuzzy ontdubbeling
+    merge_report = job.info['merged']
+    if merge_report:
+        with st.expander(f"{len(merge_report)} vergelijkbare adressen samengevoegd"):
+            st.dataframe(
+                pd.DataFrame(merge_report).rename(columns={
+                    'behouden_label': 'Behouden label',
+                    'samengevoegd_label': 'Samengevoegd label',
+                    'reden': 'Reden',
+                    'score': 'Gelijkenis',
+                })[['Behouden label', 'Samengevoegd label', 'Reden', 'Gelijkenis']],
+                width='stretch',
+                hide_index=True
+            )
+
+    # Download knop met datum in filename
+    today = datetime.fromtimestamp(job.finished_at).strftime("%Y-%m-%d")
+    st.download_button(
+        label="Download Verzendlabels PDF",
+        data=job.result_bytes,
+        file_name=f"verzendlabels_{today}.pdf",
+        mime="application/pdf",
+        width='stretch'
+    )
+
+    # Info over de PDF
+    st.info(f"PDF bevat {labels_count} labels verdeeld over {job.info['pages']} pagina's ({job.info['layout']} labels per pagina).")
+
+def show_excel_job_result(job, stale):
+    """Toon het resultaat van een afgeronde Excel taak."""
+    if job.status == BackgroundJob.CANCELLED:
+        st.warning("Excel export geannuleerd.")
+        return
+    if job.status == BackgroundJob.FAILED:
+        st.error(f"Fout bij het maken van de Excel export: {job.error}")
+        return
+
+    if job.info.get('from_cache'):
+        st.caption("Uit de export cache (zelfde bestand en filters).")
+    if stale:
+        st.caption("Gemaakt met eerdere filterinstellingen; klik opnieuw om bij te werken.")
+    st.download_button(
+        label="Download Excel (verzendformaat)",
+        data=job.result_bytes,
+        file_name=f"verzendadressen_{datetime.fromtimestamp(job.finished_at).strftime('%Y-%m-%d')}.xlsx",
+        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        width='stretch'
+    )
+
+def show_overview_and_buttons(orders, selected_products, sort_order, start_date, end_date, min_quantity, max_quantity, selected_names, product_logic, order_store=None, fuzzy_dedup=False, label_template=DEFAULT_LABEL_TEMPLATE):
+    """Toon het overzicht met beide knoppen op dezelfde pagina.
+
+    Met een order_store kunnen de orders op de gegenereerde labels daarna als geprint gemarkeerd worden.
+    fuzzy_dedup voegt bij de labels ook bijna gelijke adressen samen; label_template
+    kiest het labelvel voor de PDF.
+    """
+
+    # Pas filters toe op het OrderFrame en maak alleen de gefilterde rijen aan
+    mask = filter_orders(orders, selected_products, start_date, end_date, min_quantity, max_quantity, selected_names, product_logic)
+    df_filtered = orders.view(mask)
 
     # Toon statistieken
     st.subheader("Statistieken")
@@ -506,136 +2629,73 @@ def show_overview_and_buttons(df, selected_products, sort_order, start_date, end
     # Toon gefilterde data in tabel
     st.subheader(f"Orders ({len(df_filtered)} resultaten)")
 
-    # Selecteer kolommen om te tonen
-    display_columns = [
-        'paid_at', 'product', 'quantity', 'amount_with_tax',
-        'company', 'firstname', 'lastname', 'full_name', 'email', 'city',
-        'payment_method'
-    ]
-
-    # Zorg dat kolommen bestaan
-    display_columns = [col for col in display_columns if col in df_filtered.columns]
-
     if len(df_filtered) > 0:
-        # Formatteer de data voor weergave
-        display_df = df_filtered[display_columns].copy()
-
-        # Formatteer datums
-        if 'paid_at' in display_df.columns:
-            display_df['paid_at'] = display_df['paid_at'].dt.strftime('%d-%m-%Y %H:%M')
-
-        # Formatteer bedragen
-        if 'amount_with_tax' in display_df.columns:
-            display_df['amount_with_tax'] = display_df['amount_with_tax'].apply(
-                lambda x: f"€{x:,.2f}".replace(',', '.') if pd.notna(x) else ""
-            )
-
-        # Formatteer namen
-        if 'full_name' in display_df.columns:
-            # Rename full_name to Naam for better readability
-            display_df = display_df.rename(columns={'full_name': 'Naam'})
-            # Remove individual name columns if they exist
-            if 'firstname' in display_df.columns:
-                display_df = display_df.drop(['firstname'], axis=1)
-            if 'lastname' in display_df.columns:
-                display_df = display_df.drop(['lastname'], axis=1)
-
-        # Hernoem kolommen voor betere leesbaarheid
-        column_names = {
-            'paid_at': 'Betaaldatum',
-            'product': 'Product',
-            'quantity': 'Aantal',
-            'amount_with_tax': 'Bedrag (incl. BTW)',
-            'company': 'Bedrijf',
-            'email': 'E-mail',
-            'city': 'Plaats',
-            'payment_method': 'Betaalmethode'
-        }
-        display_df = display_df.rename(columns=column_names)
-
-        # Toon tabel met zoeken en sorteren
-        st.dataframe(
-            display_df,
-            width='stretch',
-            hide_index=True,
-            column_config={
-                col: st.column_config.TextColumn(col, width="medium")
-                for col in display_df.columns
-            }
-        )
+        # Alleen de zichtbare pagina wordt opgemaakt en naar de browser gestuurd
+        show_order_table(orders, mask)
 
         # Knoppen sectie
         st.subheader("Acties")
         col_button1, col_button2, col_button3 = st.columns(3)
 
+        # Sleutels van de exports in de export cache: upload hash plus alle filters
+        export_filters = (orders.content_hash, selected_products, start_date, end_date,
+                          min_quantity, max_quantity, sort_order, product_logic)
+        artifact_cache = get_artifact_cache()
+
+        # Exports worden pas gebouwd als er echt gedownload wordt; noteer wat dat deze rerun scheelt
+        recorder = active_stage_recorder()
+        if recorder is not None:
+            for kind in ('csv', 'excel'):
+                recorder.defer(kind, len(df_filtered), artifact_cache.estimate_build(kind, len(df_filtered)))
+
         with col_button1:
-            # Download knop voor CSV
-            csv = display_df.to_csv(index=False, encoding='utf-8-sig')
+            # Download knop voor CSV: gebouwd bij de klik, daarna uit de export cache zolang de filters gelijk blijven
+            csv_key = artifact_cache_key('csv', *export_filters, names=selected_names)
+            build_csv = lambda: format_order_table(df_filtered).to_csv(index=False, encoding='utf-8-sig').encode('utf-8')
             st.download_button(
                 label="Download gefilterde data als CSV",
-                data=csv,
+                data=lazy_export(artifact_cache, 'csv', csv_key, build_csv, len(df_filtered)),
                 file_name=f"orders_overzicht_{datetime.now().strftime('%Y-%m-%d')}.csv",
                 mime="text/csv",
                 width='stretch'
             )
 
         with col_button2:
-            # Download knop voor Excel (verzendformaat)
-            excel_bytes = generate_excel_export(df_filtered)
-            st.download_button(
-                label="Download Excel (verzendformaat)",
-                data=excel_bytes,
-                file_name=f"verzendadressen_{datetime.now().strftime('%Y-%m-%d')}.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                width='stretch'
-            )
+            # Excel (verzendformaat) wordt als achtergrondtaak gemaakt
+            excel_key = artifact_cache_key('excel', *export_filters, names=selected_names)
+            if st.button("Genereer Excel (verzendformaat)", width='stretch'):
+                start_background_job('excel', excel_key, run_excel_job, df_filtered, cache_key=excel_key)
+            show_job_panel('excel', excel_key, show_excel_job_result)
 
         with col_button3:
-            # Genereer verzendlabels knop
+            # Verzendlabels worden als achtergrondtaak gegenereerd; de sessie blijft bruikbaar
+            dedup = 'fuzzy' if fuzzy_dedup else 'exact'
+            labels_key = artifact_cache_key('labels', *export_filters, dedup=dedup, template=label_template)
             if selected_products and st.button("Genereer Verzendlabels", type="primary", width='stretch'):
-                with st.spinner("Verzendlabels worden gegenereerd..."):
-                    try:
-                        # Genereer labels met filters
-                        labels = generate_shipping_labels(
-                            df=df,
-                            allowed_products=selected_products,
-                            sort_order=sort_order,
-                            start_date=datetime.combine(start_date, datetime.min.time()) if start_date else None,
-                            end_date=datetime.combine(end_date, datetime.max.time()) if end_date else None,
-                            min_quantity=min_quantity,
-                            max_quantity=max_quantity
-                        )
-
-                        if not labels:
-                            st.error("Geen geldige labels gevonden met de geselecteerde filters.")
-                            return
-
-                        st.success(f"{len(labels)} unieke verzendlabels gegenereerd!")
-
-                        # Maak een tijdelijk bestand voor de PDF met datum in de naam
-                        today = datetime.now().strftime("%Y-%m-%d")
-                        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-                            pdf_path = create_pdf_from_labels(labels, tmp_file.name)
-
-                        # Lees de PDF voor download
-                        with open(pdf_path, 'rb') as f:
-                            pdf_bytes = f.read()
-
-                        # Download knop met datum in filename
-                        filename = f"verzendlabels_{today}.pdf"
-                        st.download_button(
-                            label="Download Verzendlabels PDF",
-                            data=pdf_bytes,
-                            file_name=filename,
-                            mime="application/pdf",
-                            width='stretch'
-                        )
-
-                        # Info over de PDF
-                        st.info(f"PDF bevat {len(labels)} labels verdeeld over {(len(labels) + 23) // 24} pagina's (8×3 labels per pagina).")
-
-                    except Exception as e:
-                        st.error(f"Fout bij het genereren van labels: {e}")
+                start_background_job(
+                    'labels', labels_key, run_label_job,
+                    orders.df,
+                    selected_products,
+                    sort_order,
+                    datetime.combine(start_date, datetime.min.time()) if start_date else None,
+                    datetime.combine(end_date, datetime.max.time()) if end_date else None,
+                    min_quantity,
+                    max_quantity,
+                    dedup,
+                    label_template,
+                    cache_key=labels_key
+                )
+            show_job_panel('labels', labels_key, show_label_job_result)
+
+        # Markeer de orders op de gegenereerde labels als geprint zodat ze bij een volgende
+        # upload niet meer terugkomen (niet het overzicht: de labels volgen hun eigen filters)
+        labels_job = st.session_state.get('background_jobs', {}).get('labels')
+        if (order_store is not None and labels_job is not None and labels_job.status == BackgroundJob.DONE
+                and labels_job.params_key == labels_key and labels_job.info.get('order_hashes')):
+            order_hashes = labels_job.info['order_hashes']
+            if st.button(f"Markeer {len(order_hashes)} orders op de labels als geprint", width='stretch'):
+                st.session_state['store_marked'] = order_store.mark_printed(order_hashes)
+                st.rerun()
 
     else:
         st.warning("Geen resultaten gevonden met de geselecteerde filters.")
@@ -655,23 +2715,83 @@ def main():
     st.title("Verzendlabels Generator")
     st.markdown("Upload een CSV-bestand met orders en genereer verzendlabels als PDF.")
 
-    # File uploader
-    uploaded_file = st.file_uploader(
-        "Upload CSV-bestand",
+    # Diagnostiek: meet per stap tijd, rijen en geheugen (uit = vrijwel geen overhead)
+    with st.sidebar:
+        diagnostics_enabled = st.toggle(
+            "Diagnostiek",
+            value=DIAGNOSTICS_DEFAULT,
+            help="Meet per stap (inlezen, filteren, labels, PDF, Excel) de tijd en het aantal rijen"
+        )
+        track_memory = st.checkbox("Piekgeheugen meten", value=False, disabled=not diagnostics_enabled,
+                                   help="Gebruikt tracemalloc (procesbreed, één sessie tegelijk); maakt de stappen merkbaar trager")
+        log_stages = st.checkbox("Stappen loggen", value=False, disabled=not diagnostics_enabled,
+                                 help="Schrijf elke stap als JSON regel naar de server log")
+
+    if not diagnostics_enabled:
+        show_orders_page()
+        return
+
+    with StageRecorder(track_memory=track_memory, log_stages=log_stages) as recorder:
+        show_orders_page()
+    show_diagnostics_panel(recorder)
+
+def show_orders_page():
+    """Upload, filters, overzicht en acties."""
+    # File uploader (meerdere exports, bijvoorbeeld per shop of per maand, worden samengevoegd)
+    uploaded_files = st.file_uploader(
+        "Upload CSV-bestand(en)",
         type=['csv'],
-        help="Upload een CSV-bestand met kolommen: company, firstname, lastname, street, housenumber, housenumber_suffix, zipcode, city, product, paid_at"
+        accept_multiple_files=True,
+        help="Upload een of meer CSV-bestanden met kolommen: company, firstname, lastname, street, housenumber, housenumber_suffix, zipcode, city, product, paid_at"
     )
 
-    if uploaded_file is not None:
+    if uploaded_files:
         # Toon bestandsinformatie
-        st.success(f"Bestand geüpload: {uploaded_file.name}")
-
-        # Lees de data
-        with st.spinner("CSV-bestand wordt gelezen..."):
-            df = read_csv_data(uploaded_file)
-
-        if df is not None:
-            st.info(f"{len(df)} rijen geladen uit het CSV-bestand")
+        upload_name = ', '.join(uploaded_file.name for uploaded_file in uploaded_files)
+        if len(uploaded_files) == 1:
+            st.success(f"Bestand geüpload: {upload_name}")
+        else:
+            st.success(f"{len(uploaded_files)} bestanden geüpload: {upload_name}")
+
+        # Lees de data (uit de cache als dezelfde inhoud al eerder is ingelezen)
+        orders = load_orders(uploaded_files)
+        if orders is not None and orders.merge_report:
+            duplicates = sum(item['duplicates'] for item in orders.merge_report)
+            st.caption("Samengevoegd: " + ', '.join(f"{item['name']} ({item['rows']} rijen)" for item in orders.merge_report)
+                       + f"; {duplicates} dubbele orders uit eerdere bestanden weggelaten")
+
+        # Orderopslag: alleen orders die nog niet eerder geprint zijn
+        order_store = None
+        with st.sidebar:
+            use_store = st.toggle(
+                "Alleen nieuwe orders",
+                value=False,
+                help="Bewaar uploads in de lokale orderopslag en toon alleen orders die nog niet als geprint gemarkeerd zijn"
+            )
+        if orders is not None and use_store:
+            order_store = get_order_store()
+            orders = load_unprinted_orders(order_store, upload_name, orders)
+
+        if orders is not None:
+            df = orders.df
+            if order_store is None:
+                st.info(f"{len(df)} rijen geladen uit het CSV-bestand")
+            else:
+                store_stats = order_store.stats()
+                st.info(f"{len(df)} nog niet geprinte orders ({store_stats['printed']} van {store_stats['total']} opgeslagen orders al geprint)")
+                marked = st.session_state.pop('store_marked', None)
+                if marked is not None:
+                    st.success(f"{marked} orders als geprint gemarkeerd")
+            memory_report = orders.memory_report
+            st.caption(f"Geheugen orders: {memory_report['after'] / 1024 ** 2:.1f} MB "
+                       f"(was {memory_report['before'] / 1024 ** 2:.1f} MB zonder compacte kolomtypes)")
+            cache_stats = get_ingest_cache().stats()
+            st.caption(f"Ingestie cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, "
+                       f"{cache_stats['entries']} bestand(en), {cache_stats['bytes'] / 1024 ** 2:.1f} MB")
+            export_stats = get_artifact_cache().stats()
+            st.caption(f"Export cache: {export_stats['hits']} hits, {export_stats['misses']} misses, "
+                       f"{export_stats['evictions']} verwijderd, {export_stats['entries']} export(s), "
+                       f"{export_stats['bytes'] / 1024 ** 2:.1f} MB")
 
             # Algemene filters die voor beide tabs gelden
             st.header("Verzendlabels Generator")
@@ -685,6 +2805,23 @@ def main():
                 help="Sorteer de labels op basis van de betaaldatum"
             )
 
+            # Ontdubbeling van adressen op de labels
+            fuzzy_dedup = st.checkbox(
+                "Vergelijkbare adressen samenvoegen",
+                value=False,
+                help="Voeg ook adressen samen die alleen verschillen in hoofdletters, spaties, leestekens "
+                     "(bijv. '1A' en '1 a') of een kleine schrijfvariant van de naam op hetzelfde postcode/huisnummer"
+            )
+
+            # Labelvel voor de PDF
+            label_template = st.selectbox(
+                "Labelvel:",
+                options=list(LABEL_TEMPLATES),
+                index=list(LABEL_TEMPLATES).index(DEFAULT_LABEL_TEMPLATE),
+                format_func=lambda name: LABEL_TEMPLATES[name].description or name,
+                help="Indeling van het stickervel waarop de labels geprint worden"
+            )
+
             # Aantal filter eerst voor dynamische filtering
             st.subheader("Aantal Filteren")
             col_qty1, col_qty2 = st.columns(2)
@@ -704,7 +2841,7 @@ def main():
                 )
 
             # Get initial date range and store in session state
-            df_dates = pd.to_datetime(df['paid_at'], errors='coerce').dropna()
+            df_dates = df[PAID_AT_PARSED].dropna()
             if not df_dates.empty:
                 overall_min_date = df_dates.min().date()
                 overall_max_date = df_dates.max().date()
@@ -739,20 +2876,15 @@ def main():
             # Product filter met dynamische beschikbaarheid
             st.subheader("Producten Filteren")
 
-            # Creëer tijdelijke gefilterde data op basis van hoeveelheid
-            df_quantity_filtered = df.copy()
-            df_quantity_filtered['quantity_clean'] = df_quantity_filtered['quantity'].apply(lambda x: int(x) if pd.notna(x) and str(x).isdigit() else 1)
-            df_quantity_filtered = df_quantity_filtered[df_quantity_filtered['quantity_clean'] >= min_quantity]
-            if max_quantity is not None:
-                df_quantity_filtered = df_quantity_filtered[df_quantity_filtered['quantity_clean'] <= max_quantity]
+            # Mask op basis van hoeveelheid (geen kopie van de data)
+            quantity_mask = orders.quantity_mask(min_quantity, max_quantity)
 
-            # Haal unieke producten op die voldoen aan hoeveelheid filter
-            available_products = df_quantity_filtered['product'].dropna().unique().tolist()
+            # Haal unieke producten op die voldoen aan hoeveelheid filter (via de productindex)
+            available_products = orders.index.available_products(quantity_mask)
             available_products = [str(p) for p in available_products if p and str(p) != 'nan']
 
             # Haal alle unieke producten op voor informatie
-            all_products = df['product'].dropna().unique().tolist()
-            all_products = [str(p) for p in all_products if p and str(p) != 'nan']
+            all_products = [str(p) for p in orders.index.products if p and str(p) != 'nan']
 
             # Update session state gebaseerd op beschikbare producten
             if 'product_selections' not in st.session_state:
@@ -785,16 +2917,21 @@ def main():
 
             # Naam filter
             st.subheader("Naam Filteren")
-            # Combineer naam velden voor filteren
-            df['full_name'] = df.apply(lambda row: f"{str(row.get('firstname', '')).strip()} {str(row.get('lastname', '')).strip()}".strip(), axis=1)
-            unique_names = df['full_name'].dropna().unique().tolist()
-            unique_names = [name for name in unique_names if name and name != 'nan']
+            # Zoeken via de naamindex van de upload; de keuzelijst toont de beste treffers
+            name_query = st.text_input(
+                "Zoek persoon:",
+                key='name_search',
+                placeholder="Typ (een deel van) een naam",
+                help=f"Zoekt op begin van de naam, op achternaam en midden in de naam ({len(orders.name_index)} namen)"
+            )
+            already_selected = [name for name in st.session_state.get('selected_names', []) if isinstance(name, str)]
+            name_options = list(dict.fromkeys(already_selected + orders.name_index.search(name_query, NAME_SEARCH_LIMIT)))
 
             selected_names = st.multiselect(
                 "Selecteer personen:",
-                unique_names[:100],  # Beperk tot eerste 100 voor performance
-                default=[],
-                help="Filter op specifieke personen (max 100 getoond)"
+                name_options,
+                key='selected_names',
+                help=f"Filter op specifieke personen (max {NAME_SEARCH_LIMIT} zoekresultaten getoond)"
             )
 
             # Product logica filter
@@ -818,17 +2955,10 @@ def main():
             # Update date range based on selected products (only as suggestion)
             if selected_products:
                 # Filter data on selected products and quantity
-                temp_df = df.copy()
-                temp_df['quantity_clean'] = temp_df['quantity'].apply(lambda x: int(x) if pd.notna(x) and str(x).isdigit() else 1)
-                temp_df = temp_df[temp_df['quantity_clean'] >= min_quantity]
-                if max_quantity is not None:
-                    temp_df = temp_df[temp_df['quantity_clean'] <= max_quantity]
-
-                # Filter on selected products
-                temp_df = temp_df[temp_df['product'].isin(selected_products)]
+                product_mask = quantity_mask & orders.product_mask(selected_products)
 
                 # Get dates from filtered products
-                product_dates = pd.to_datetime(temp_df['paid_at'], errors='coerce').dropna()
+                product_dates = df[PAID_AT_PARSED][product_mask].dropna()
                 if not product_dates.empty:
                     suggested_start_date = product_dates.min().date()
                     suggested_end_date = product_dates.max().date()
@@ -841,7 +2971,7 @@ def main():
                         st.info(f"📅 Datumbereik aangepast voor geselecteerde producten: {suggested_start_date} t/m {suggested_end_date}")
 
             # Toon het overzicht en knoppen op dezelfde pagina
-            show_overview_and_buttons(df, selected_products, sort_order, start_date, end_date, min_quantity, max_quantity, selected_names, product_logic)
+            show_overview_and_buttons(orders, selected_products, sort_order, start_date, end_date, min_quantity, max_quantity, selected_names, product_logic, order_store, fuzzy_dedup, label_template)
 
     
 if __name__ == "__main__":
@@ -0,0 +1,84 @@
+"""App test: een grote labelrun als achtergrondtaak, over reruns heen."""
+
+import os
+import time
+from io import BytesIO
+
+import pytest
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+from benchmark_labels import write_synthetic_csv
+from streamlit_labels_app import PARALLEL_MIN_LABELS
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'streamlit_labels_app.py')
+
+
+class UploadedCsv(BytesIO):
+    name = 'orders.csv'
+    file_id = 'synthetisch'
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """De echte app met een synthetische upload van ruim PARALLEL_MIN_LABELS labels."""
+    csv_path = write_synthetic_csv(str(tmp_path / 'orders.csv'), 6 * PARALLEL_MIN_LABELS, seed=7)
+    with open(csv_path, 'rb') as f:
+        data = f.read()
+
+    def file_uploader(*args, **kwargs):
+        upload = UploadedCsv(data)
+        return [upload] if kwargs.get('accept_multiple_files') else upload
+
+    monkeypatch.setattr(st, 'file_uploader', file_uploader)
+    monkeypatch.setenv('LABELS_PDF_WORKERS', '2')
+    monkeypatch.setenv('LABELS_ARTIFACT_CACHE', str(tmp_path / 'exports'))
+    monkeypatch.setenv('LABELS_ORDER_STORE', str(tmp_path / 'orders.sqlite'))
+    st.cache_resource.clear()
+    st.cache_data.clear()
+    yield AppTest.from_file(APP_PATH, default_timeout=120)
+    st.cache_resource.clear()
+    st.cache_data.clear()
+
+
+def click(at, label):
+    next(button for button in at.button if label in button.label).click()
+    at.run()
+
+
+def rerun_until(at, done, timeout=180):
+    """Rerun zoals de poller van de taak, tot done(at) waar is of er een fout is."""
+    deadline = time.monotonic() + timeout
+    while not done(at) and not at.exception and time.monotonic() < deadline:
+        time.sleep(0.5)
+        at.run()
+    assert not at.exception, [e.value for e in at.exception]
+    assert done(at), "achtergrondtaak niet op tijd klaar"
+
+
+def diagnostics_stages(at):
+    stages = set()
+    for frame in at.dataframe:
+        df = frame.value
+        if 'taak' in df.columns:
+            stages.update(zip(df['taak'], df['stage']))
+    return stages
+
+
+def test_large_label_job_survives_reruns(app):
+    at = app.run()
+    assert not at.exception, [e.value for e in at.exception]
+    next(toggle for toggle in at.toggle if toggle.label == "Diagnostiek").set_value(True)
+    at.run()
+
+    click(at, "Genereer Verzendlabels")
+    rerun_until(at, lambda at: any('gegenereerd' in s.value for s in at.success))
+    assert not at.error, [e.value for e in at.error]
+
+    label_count = int(next(s.value for s in at.success if 'gegenereerd' in s.value).split()[0])
+    assert label_count >= PARALLEL_MIN_LABELS
+    assert {('labels', 'generate_labels'), ('labels', 'create_pdf')} <= diagnostics_stages(at)
+
+    click(at, "Genereer Excel")
+    rerun_until(at, lambda at: ('excel', 'excel_export') in diagnostics_stages(at))
+    assert not at.error, [e.value for e in at.error]
@@ -0,0 +1,16 @@
+"""Export cache: sleutels veranderen mee met de cacheversie."""
+
+import streamlit_labels_app
+from streamlit_labels_app import artifact_cache_key
+
+
+def labels_key():
+    return artifact_cache_key('labels', 'upload', ['Boek deel 1'], None, None, 1, None, 'newest_first', 'OR',
+                              dedup='exact', template='a4_3x8')
+
+
+def test_key_changes_with_cache_version(monkeypatch):
+    key = labels_key()
+    assert labels_key() == key
+    monkeypatch.setattr(streamlit_labels_app, 'ARTIFACT_CACHE_VERSION', streamlit_labels_app.ARTIFACT_CACHE_VERSION + 1)
+    assert labels_key() != key
@@ -0,0 +1,22 @@
+"""--chunksize weigert opties die blok voor blok lezen niet ondersteunt."""
+
+import pytest
+
+import labels_cli
+
+
+@pytest.mark.parametrize('flags', [
+    ['--store', '{tmp}/orders.sqlite'],
+    ['--dedup', 'fuzzy'],
+    ['--names', 'Jan Jansen'],
+    ['--merge'],
+])
+def test_chunksize_rejects_unsupported_flags(tmp_path, capsys, flags):
+    csv_paths = [str(tmp_path / 'a.csv'), str(tmp_path / 'b.csv')]
+    exit_code = labels_cli.main([*csv_paths, '--products', 'Boek deel 1', '--chunksize', '100',
+                                 '--output-dir', str(tmp_path / 'uit'),
+                                 *(flag.format(tmp=tmp_path) for flag in flags)])
+    assert exit_code == 2
+    assert '--chunksize gaan niet samen' in capsys.readouterr().err
+    assert not (tmp_path / 'uit').exists()
+    assert not (tmp_path / 'orders.sqlite').exists()
@@ -0,0 +1,43 @@
+"""Datumfilter met één grens: labels en Excel export bevatten dezelfde orders."""
+
+import json
+
+import pandas as pd
+import pytest
+
+import labels_cli
+
+
+def order(firstname, paid_at):
+    return {
+        'company': '', 'firstname': firstname, 'lastname': 'Jansen',
+        'street': 'Kerkstraat', 'housenumber': '12', 'housenumber_suffix': '',
+        'zipcode': '3511 AB', 'city': 'Utrecht', 'country_code': 'NL',
+        'product': 'Boek deel 1', 'quantity': '1', 'paid_at': paid_at,
+        'amount_with_tax': '19.95', 'email': f'{firstname.lower()}@example.nl', 'payment_method': 'ideal',
+    }
+
+
+@pytest.mark.parametrize('bound, expected', [
+    (['--start-date', '2024-01-01'], 2),
+    (['--end-date', '2023-12-31'], 1),
+])
+def test_single_date_bound_filters_pdf_and_excel(tmp_path, bound, expected):
+    csv_path = tmp_path / 'orders.csv'
+    pd.DataFrame([
+        order('Jan', '15-12-2023 10:00:00'),
+        order('Anna', '05-01-2024 10:00:00'),
+        order('Piet', '06-01-2024 10:00:00'),
+        order('Fleur', 'onbekend'),
+    ]).to_csv(csv_path, index=False)
+    timings_path = tmp_path / 'timings.json'
+
+    exit_code = labels_cli.main([
+        str(csv_path), *bound, '--output-dir', str(tmp_path), '--pdf-mode', 'single_pass',
+        '--timings', str(timings_path),
+    ])
+    assert exit_code == 0
+    summary = json.loads(timings_path.read_text(encoding='utf-8'))['files'][0]
+    assert summary['labels'] == expected
+    assert summary['filtered_orders'] == expected
+    assert len(pd.read_excel(summary['outputs']['excel'])) == expected
@@ -0,0 +1,46 @@
+"""De streaming Excel export geeft dezelfde werkmap als de oorspronkelijke pandas export."""
+
+from io import BytesIO
+
+import pytest
+from openpyxl import load_workbook
+
+from benchmark_labels import write_synthetic_csv
+from streamlit_labels_app import (
+    OrderFrame,
+    generate_excel_export,
+    generate_excel_export_streaming,
+    read_csv_data,
+)
+
+
+def sheet_contents(excel_bytes):
+    """Celwaarden per rij en kolombreedtes per kolomletter van het verzendadressen blad."""
+    worksheet = load_workbook(BytesIO(excel_bytes))['Verzendadressen']
+    rows = [list(row) for row in worksheet.iter_rows(values_only=True)]
+    widths = {letter: dimension.width for letter, dimension in worksheet.column_dimensions.items()}
+    return rows, widths
+
+
+@pytest.fixture(scope='module')
+def orders_df(tmp_path_factory):
+    path = write_synthetic_csv(str(tmp_path_factory.mktemp('excel') / 'orders.csv'), 3000, seed=9)
+    return read_csv_data(path)
+
+
+@pytest.fixture(scope='module')
+def expected(orders_df):
+    """De werkmap van de oorspronkelijke pandas export als referentie."""
+    return sheet_contents(generate_excel_export(orders_df, mode='pandas'))
+
+
+def test_streaming_matches_pandas(orders_df, expected):
+    assert sheet_contents(generate_excel_export(orders_df, mode='streaming')) == expected
+    # Kleine blokken: de blokgrenzen mogen niets aan de uitvoer veranderen
+    assert sheet_contents(generate_excel_export_streaming(orders_df, chunk_size=700)) == expected
+
+
+def test_streaming_matches_pandas_on_order_frame(orders_df, expected):
+    # Het pad van de app: compacte dtypes en geparste datums
+    orders = OrderFrame.from_dataframe(orders_df)
+    assert sheet_contents(generate_excel_export(orders.df, mode='streaming')) == expected
@@ -0,0 +1,44 @@
+"""Fuzzy adresontdubbeling: schrijfvarianten samenvoegen, huisgenoten niet."""
+
+import pandas as pd
+
+from streamlit_labels_app import generate_shipping_labels
+
+
+def order(firstname, lastname, street='Kerkstraat', housenumber='12', paid_at='05-01-2024 10:00:00'):
+    return {
+        'company': '', 'firstname': firstname, 'lastname': lastname,
+        'street': street, 'housenumber': housenumber, 'housenumber_suffix': '',
+        'zipcode': '3511 AB', 'city': 'Utrecht', 'country_code': 'NL',
+        'product': 'Boek deel 1', 'quantity': '1', 'paid_at': paid_at,
+    }
+
+
+def fuzzy_labels(rows):
+    merge_report = []
+    labels = generate_shipping_labels(pd.DataFrame(rows), ['Boek deel 1'], sort_order='oldest_first',
+                                      dedup='fuzzy', merge_report=merge_report)
+    return labels, merge_report
+
+
+def test_household_members_keep_their_own_label():
+    labels, merge_report = fuzzy_labels([
+        order('Anna', 'de Vries'),
+        order('Anne', 'de Vries'),
+        order('Jan', 'de Vries'),
+        order('Eva', 'de Vries'),
+        order('Piet', 'Bakker'),
+        order('Kees', 'Bakker'),
+    ])
+    assert len(labels) == 6
+    assert merge_report == []
+
+
+def test_spelling_variants_of_one_person_are_merged():
+    labels, merge_report = fuzzy_labels([
+        order('Jan', 'Janssen', paid_at='05-01-2024 10:00:00'),
+        order('Jan', 'Jansen', street='Kerkstr', paid_at='06-01-2024 10:00:00'),
+        order('Anna', 'de Vries'),
+    ])
+    assert len(labels) == 2
+    assert [entry['reden'] for entry in merge_report] == ['fuzzy']
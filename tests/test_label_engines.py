@@ -0,0 +1,60 @@
+"""Gelijke labels uit de rij-engine, de kolomgewijze engine, het OrderFrame pad en de blok-voor-blok engine."""
+
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+from benchmark_labels import compare_label_engines, label_engine_scenarios, write_synthetic_csv
+from streamlit_labels_app import (
+    PAID_AT_PARSED,
+    OrderFrame,
+    generate_shipping_labels,
+    generate_shipping_labels_chunked,
+    read_csv_data,
+)
+
+SEEDS = [1, 2, 3]
+
+
+@pytest.fixture(params=SEEDS)
+def synthetic_csv(request, tmp_path):
+    """Synthetische CSV export met een willekeurige seed, plus de ingelezen DataFrame."""
+    path = write_synthetic_csv(str(tmp_path / 'orders.csv'), 1500, seed=request.param)
+    return path, read_csv_data(path)
+
+
+def test_columnar_engine_matches_rows_engine(synthetic_csv):
+    _, df = synthetic_csv
+    compare_label_engines(df)
+
+
+def test_order_frame_matches_rows_engine(synthetic_csv):
+    _, df = synthetic_csv
+    orders = OrderFrame.from_dataframe(df)
+    # Het pad van de app: geparste datums en categorische kolommen
+    assert PAID_AT_PARSED in orders.df.columns
+    assert isinstance(orders.df['product'].dtype, pd.CategoricalDtype)
+    for scenario in label_engine_scenarios():
+        expected = generate_shipping_labels(df, engine='rows', **scenario)
+        assert generate_shipping_labels(orders.df, **scenario) == expected, scenario
+
+
+def test_chunked_engine_matches_rows_engine(synthetic_csv):
+    path, df = synthetic_csv
+    for scenario in label_engine_scenarios():
+        expected = generate_shipping_labels(df, engine='rows', **scenario)
+        assert generate_shipping_labels_chunked(path, chunksize=400, **scenario) == expected, scenario
+
+
+def test_iso_dates_only_in_columnar_engine(synthetic_csv):
+    _, df = synthetic_csv
+    df = df.copy()
+    df.loc[df.index[:50], 'paid_at'] = '2024-05-01T12:00:00'
+    compare_label_engines(df)
+
+    iso_order = df.iloc[[0]].assign(product='Boek deel 1', quantity='1')
+    scenario = {'allowed_products': ['Boek deel 1'], 'start_date': datetime(2024, 5, 1),
+                'end_date': datetime(2024, 5, 1, 23, 59, 59)}
+    assert len(generate_shipping_labels(iso_order, **scenario)) == 1
+    assert generate_shipping_labels(iso_order, engine='rows', **scenario) == []
@@ -0,0 +1,67 @@
+"""Meerdere uploads: inlezen, kolommen uitlijnen en orders over bestanden heen ontdubbelen."""
+
+from io import BytesIO
+
+import pandas as pd
+
+from benchmark_labels import synthetic_orders
+from streamlit_labels_app import ORDER_COLUMNS, align_order_columns, merge_order_files, read_order_files
+
+
+def csv_bytes(df):
+    return df.to_csv(index=False).encode('utf-8')
+
+
+def test_overlapping_exports_merge_to_unique_orders():
+    orders = synthetic_orders(1500, seed=5)
+    first, second = orders.iloc[:1000], orders.iloc[700:]
+    results = read_order_files([('jan', csv_bytes(first)), ('feb', csv_bytes(second))], workers=2)
+    assert [(name, error) for name, _, error in results] == [('jan', None), ('feb', None)]
+
+    merged, report = merge_order_files([(name, df) for name, df, _ in results])
+    assert len(merged) == 1500
+    assert report == [
+        {'name': 'jan', 'rows': 1000, 'duplicates': 0},
+        {'name': 'feb', 'rows': 800, 'duplicates': 300},
+    ]
+    # Volgorde: eerst het hele eerste bestand, daarna de nieuwe orders uit het tweede
+    assert merged['email'].tolist() == orders['email'].tolist()
+
+
+def test_duplicates_within_one_file_stay():
+    order = synthetic_orders(1, seed=5)
+    merged, report = merge_order_files([('a', pd.concat([order, order])), ('b', order)])
+    assert len(merged) == 2
+    assert [entry['duplicates'] for entry in report] == [0, 1]
+
+
+def test_headers_are_aligned_and_missing_columns_added():
+    order = synthetic_orders(1, seed=5)
+    messy = order.drop(columns=['payment_method']).rename(columns={'zipcode': ' Zipcode ', 'city': 'City'})
+    aligned = align_order_columns(messy)
+    assert set(ORDER_COLUMNS) <= set(aligned.columns)
+    assert aligned['payment_method'].isna().all()
+    assert aligned['zipcode'].tolist() == order['zipcode'].tolist()
+
+    merged, _ = merge_order_files([('a', order), ('b', messy)])
+    assert len(merged) == 2
+    assert ' Zipcode ' not in merged.columns and 'City' not in merged.columns
+
+
+def test_numeric_and_text_columns_merge_as_text():
+    order = synthetic_orders(1, seed=5).assign(zipcode='1234')
+    numeric = pd.read_csv(BytesIO(csv_bytes(order)))
+    assert pd.api.types.is_numeric_dtype(numeric['zipcode'])
+    text = pd.concat([order, order.assign(zipcode='1234 AB', email='ander@example.nl')])
+
+    merged, report = merge_order_files([('getal', numeric), ('tekst', text)])
+    # Dezelfde order met postcode 1234 als getal en als tekst telt één keer
+    assert [entry['duplicates'] for entry in report] == [0, 1]
+    assert merged['zipcode'].tolist() == ['1234', '1234 AB']
+
+
+def test_unreadable_file_reports_an_error():
+    results = read_order_files([('leeg', b''), ('goed', csv_bytes(synthetic_orders(3, seed=5)))], workers=2)
+    (_, empty_df, empty_error), (_, good_df, good_error) = results
+    assert empty_df is None and empty_error
+    assert len(good_df) == 3 and good_error is None
@@ -0,0 +1,48 @@
+"""parse_paid_at: vaste formaten plus het vangnet voor ISO 8601 en andere notaties."""
+
+import pandas as pd
+
+from streamlit_labels_app import parse_paid_at
+
+
+def test_known_formats_and_iso_values():
+    values = pd.Series([
+        '2024-01-05 10:00:00',
+        '05-01-2024 10:00:00',
+        '2024-01-05',
+        '2024-01-05T10:00:00',
+        '2024-01-05T10:00:00.250',
+        'onbekend',
+        None,
+    ])
+    parsed = parse_paid_at(values)
+    assert list(parsed[:5]) == [
+        pd.Timestamp('2024-01-05 10:00:00'),
+        pd.Timestamp('2024-01-05 10:00:00'),
+        pd.Timestamp('2024-01-05'),
+        pd.Timestamp('2024-01-05 10:00:00'),
+        pd.Timestamp('2024-01-05 10:00:00.250'),
+    ]
+    assert parsed[5:].isna().all()
+
+
+def test_timezones_become_local_time():
+    parsed = parse_paid_at(pd.Series([
+        '2024-01-05T00:30:00+01:00',
+        '2024-07-05T23:30:00Z',
+        '2024-01-05T10:00:00+0200',
+    ]))
+    assert list(parsed) == [
+        pd.Timestamp('2024-01-05 00:30:00'),
+        pd.Timestamp('2024-07-06 01:30:00'),
+        pd.Timestamp('2024-01-05 09:00:00'),
+    ]
+
+
+def test_free_notation_reads_day_before_month():
+    parsed = parse_paid_at(pd.Series(['05/01/2024', '5-1-2024', '5/1/2024 23:00']))
+    assert list(parsed) == [
+        pd.Timestamp('2024-01-05'),
+        pd.Timestamp('2024-01-05'),
+        pd.Timestamp('2024-01-05 23:00:00'),
+    ]
@@ -0,0 +1,90 @@
+"""PDF buffers: grote runs gaan naar schijf en laten geen bestanden of file descriptors achter."""
+
+import gc
+import os
+import sys
+import tempfile
+import tracemalloc
+from io import BytesIO
+
+import pytest
+from PyPDF2 import PdfReader
+
+from streamlit_labels_app import BackgroundJob, create_pdf_from_labels, pdf_buffer
+
+
+def synthetic_labels(count):
+    return [f"Naam {i}\nStraat {i}\n1234 AB Plaats" for i in range(count)]
+
+
+def open_fds():
+    return set(os.listdir('/proc/self/fd'))
+
+
+@pytest.fixture
+def temp_dir(tmp_path, monkeypatch):
+    """Eigen map voor tijdelijke bestanden, zodat achtergebleven bestanden zichtbaar zijn."""
+    directory = tmp_path / 'tmp'
+    directory.mkdir()
+    monkeypatch.setattr(tempfile, 'tempdir', str(directory))
+    return directory
+
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason="telt file descriptors via /proc")
+def test_large_run_spills_to_disk_and_is_released(temp_dir):
+    fds_before = open_fds()
+    buffer = pdf_buffer(max_size=64 * 1024)
+    create_pdf_from_labels(synthetic_labels(2400), buffer, mode='single_pass')
+    assert buffer._rolled
+    assert open_fds() - fds_before
+
+    job = BackgroundJob('labels')
+    job.result = buffer
+    data = job.result_bytes()
+    assert len(data) > 64 * 1024
+    assert len(PdfReader(BytesIO(data)).pages) == 100
+
+    del job, buffer
+    gc.collect()
+    assert open_fds() - fds_before == set()
+    assert list(temp_dir.iterdir()) == []
+
+
+def test_large_run_keeps_one_copy_in_memory(temp_dir):
+    labels = synthetic_labels(3600)
+    # Caches (fonts, tekstbreedtes per label) vooraf vullen, zodat alleen de PDF zelf meetelt
+    create_pdf_from_labels(labels, BytesIO(), mode='single_pass')
+
+    tracemalloc.start()
+    try:
+        buffer = pdf_buffer(max_size=64 * 1024)
+        create_pdf_from_labels(labels, buffer, mode='single_pass')
+        pdf_size = buffer.tell()
+        retained, _ = tracemalloc.get_traced_memory()
+
+        job = BackgroundJob('labels')
+        job.result = buffer
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        data = job.result_bytes()
+        _, download_peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    # Na het renderen staat de PDF op schijf, niet in het geheugen
+    assert pdf_size > 150 * 1024
+    assert retained < pdf_size / 2
+    # Een download maakt precies één kopie: de bytes die Streamlit bewaart
+    assert len(data) == pdf_size
+    assert download_peak - before < 1.2 * pdf_size
+
+
+def test_merge_mode_leaves_only_the_output_file(tmp_path, temp_dir):
+    output_dir = tmp_path / 'uit'
+    output_dir.mkdir()
+    output_path = output_dir / 'labels.pdf'
+    create_pdf_from_labels(synthetic_labels(240), str(output_path), mode='merge')
+
+    assert [path.name for path in output_dir.iterdir()] == ['labels.pdf']
+    assert list(temp_dir.iterdir()) == []
+    assert len(PdfReader(str(output_path)).pages) == 10
@@ -0,0 +1,47 @@
+"""StageRecorder: logregels per stap en het procesbrede tracemalloc."""
+
+import json
+import logging
+import tracemalloc
+
+from streamlit_labels_app import STAGE_LOGGER, StageRecorder
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+def test_logged_stages_reach_a_handler():
+    with StageRecorder(log_stages=True) as recorder:
+        assert STAGE_LOGGER.isEnabledFor(logging.INFO)
+        assert STAGE_LOGGER.handlers
+        handler = ListHandler()
+        STAGE_LOGGER.addHandler(handler)
+        try:
+            with recorder.stage('filter', rows_in=10):
+                pass
+        finally:
+            STAGE_LOGGER.removeHandler(handler)
+    assert [json.loads(message)['stage'] for message in handler.messages] == ['filter']
+
+
+def test_only_one_recorder_measures_memory():
+    assert not tracemalloc.is_tracing()
+    with StageRecorder(track_memory=True) as first:
+        with StageRecorder(track_memory=True) as second:
+            assert second.memory_busy and not second.track_memory
+        # De tweede recorder stopt tracemalloc niet voor de eerste
+        assert tracemalloc.is_tracing()
+        with first.stage('allocate'):
+            data = bytearray(1024 ** 2)
+        del data
+    assert not tracemalloc.is_tracing()
+    assert first.records[0]['peak_bytes'] >= 1024 ** 2
+
+    with StageRecorder(track_memory=True) as third:
+        assert not third.memory_busy
@@ -0,0 +1,51 @@
+"""Orderopslag: alleen de orders die op een label staan worden als geprint gemarkeerd."""
+
+import json
+
+import pandas as pd
+from PyPDF2 import PdfReader
+
+import labels_cli
+from streamlit_labels_app import OrderStore
+
+
+def order(firstname, quantity='1', product='Boek deel 1', paid_at='05-01-2024 10:00:00'):
+    return {
+        'company': '', 'firstname': firstname, 'lastname': 'Jansen',
+        'street': 'Kerkstraat', 'housenumber': '12', 'housenumber_suffix': '',
+        'zipcode': '3511 AB', 'city': 'Utrecht', 'country_code': 'NL',
+        'product': product, 'quantity': quantity, 'paid_at': paid_at,
+        'amount_with_tax': '19.95', 'email': f'{firstname.lower()}@example.nl', 'payment_method': 'ideal',
+    }
+
+
+def test_cli_marks_the_orders_on_the_labels(tmp_path):
+    csv_path = tmp_path / 'orders.csv'
+    pd.DataFrame([
+        order('Jan'),
+        order('Jan', product='Boek deel 2'),
+        order('Fleur', paid_at='onbekend'),
+        order('Anna', paid_at='06-01-2024 10:00:00'),
+        order('Piet', quantity='-1'),
+        order('Klaas', product='Cadeaubon'),
+    ]).to_csv(csv_path, index=False)
+    store_path = tmp_path / 'orders.sqlite'
+    timings_path = tmp_path / 'timings.json'
+
+    # Het naamfilter geldt alleen voor de Excel export; de labels krijgen alle personen
+    exit_code = labels_cli.main([
+        str(csv_path), '--products', 'Boek deel 1', 'Boek deel 2', '--names', 'Jan Jansen',
+        '--store', str(store_path), '--output-dir', str(tmp_path), '--pdf-mode', 'single_pass',
+        '--timings', str(timings_path),
+    ])
+    assert exit_code == 0
+    summary = json.loads(timings_path.read_text(encoding='utf-8'))['files'][0]
+    assert summary['labels'] == 3
+    assert summary['store']['marked_printed'] == 4
+
+    # Nieuwste eerst; orders zonder datum komen achteraan
+    text = PdfReader(summary['outputs']['pdf']).pages[0].extract_text()
+    assert text.index('Anna Jansen') < text.index('Jan Jansen') < text.index('Fleur Jansen')
+
+    unprinted = OrderStore(str(store_path)).unprinted()
+    assert sorted(unprinted['firstname']) == ['Klaas', 'Piet']